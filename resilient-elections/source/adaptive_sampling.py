@@ -0,0 +1,92 @@
+import numpy as np
+
+from parameters import CI_HALF_WIDTH, CI_HALF_WIDTH_EXP3, MIN_ELECTIONS, MIN_ITERATIONS, RULE_IDS, percentage_changes
+
+# Adaptive sequential sampling: elections of a parameter set are only sampled until the estimates plotted by
+# generate_diagrams.py are precise enough, i.e., until the 95% confidence intervals of all mean distances (EXP1) and
+# mean distance gaps (EXP2) have a half-width of at most CI_HALF_WIDTH, and those of all replacement rates (EXP3) of at
+# most CI_HALF_WIDTH_EXP3, where the estimates of the single elections are treated as samples. At least MIN_ELECTIONS
+# and at most NUM_ELECTIONS are sampled.
+#
+# Likewise, iterations of an election are only sampled until its own estimates are precise enough. As those are
+# averaged over at least MIN_ELECTIONS elections, their confidence intervals may be sqrt(MIN_ELECTIONS) times as wide.
+# At least MIN_ITERATIONS and at most NUM_ITERATIONS are sampled.
+#
+# Estimates whose samples all agree so far, e.g., distances which are all 0 at small percentages of changes, must not
+# count as precise right away: the variance of distances is at least that of the samples with one more sample which
+# differs by 1, and the confidence intervals of replacement rates are Wilson score intervals, whose width does not
+# vanish for rates of 0 or 1.
+
+Z_95 = 1.96  # quantile of the standard normal distribution for 95% confidence intervals
+ELECTION_WIDTH_FACTOR = np.sqrt(max(MIN_ELECTIONS, 1))
+
+OPS = ["ADD", "DEL", "MIX"]
+
+
+def half_widths(samples, step=1):
+    # Half-widths of the confidence intervals of the means over the last axis, with the variance of the samples taken
+    # to be at least that of the samples and one more which differs from all of them by `step`
+    num_samples = samples.shape[-1]
+    variance = np.maximum(samples.var(axis=-1, ddof=1), step ** 2 / (num_samples + 1))
+    return Z_95 * np.sqrt(variance / num_samples)
+
+
+def wilson_half_widths(successes, trials):
+    # Half-widths of the Wilson score intervals of the rates successes / trials
+    rates = successes / trials
+    return Z_95 / (1 + Z_95 ** 2 / trials) * np.sqrt(rates * (1 - rates) / trials + Z_95 ** 2 / (4 * trials ** 2))
+
+
+def iterations_converged(results, num_iterations):
+    """Whether the estimates of the election with `results` (see `run_one_election`) after `num_iterations` suffice."""
+    if num_iterations < max(MIN_ITERATIONS, 2):
+        return False
+
+    distances = np.array([[results[rule]["EXP1"][op][percentage] for percentage in percentage_changes]
+                          for rule in RULE_IDS for op in OPS])
+    distance_gaps = np.array([[[distance_gap for _, distance_gap in results[rule]["EXP2"]["MIX"][percentage]]
+                               for percentage in percentage_changes] for rule in RULE_IDS])
+    # Replacements per iteration are Bernoulli trials
+    replacements = np.array([[results[rule]["EXP3"]["MIX"][percentage] for percentage in percentage_changes]
+                             for rule in RULE_IDS])
+
+    target, target_exp3 = ELECTION_WIDTH_FACTOR * CI_HALF_WIDTH, ELECTION_WIDTH_FACTOR * CI_HALF_WIDTH_EXP3
+    return bool((half_widths(distances) <= target).all() and (half_widths(distance_gaps) <= target).all()
+                and (wilson_half_widths(replacements, num_iterations) <= target_exp3).all())
+
+
+class ConvergenceTracker:
+    def __init__(self):
+        """
+        Estimates of every election of one parameter set, from which the precision of the estimates of the parameter
+        set follows: the mean distances of its elections are treated as samples of the mean distance, and so on.
+        Replacement rates are at least as imprecise as if all iterations of all elections were Bernoulli trials of
+        the same rate.
+        """
+        self.distance_estimates = []
+        self.rate_estimates = []
+        self.replacements = 0  # (replacements, iterations) per rate, summed over the elections
+        self.converged = False  # updated by `add`
+
+    def add(self, summary):
+        # `summary` of a single election, see `streaming_stats.summarize_results`
+        distances = [summary[rule]["EXP1"][op][str(percentage)].mean
+                     for rule in RULE_IDS for op in OPS for percentage in percentage_changes]
+        distance_gaps = [summary[rule]["EXP2"]["MIX"][str(percentage)]["Distance_Gaps"].mean
+                         for rule in RULE_IDS for percentage in percentage_changes]
+        rates = [histogram for rule in RULE_IDS for percentage in percentage_changes
+                 for histogram in summary[rule]["EXP3"]["MIX"][str(percentage)]]
+        self.distance_estimates.append(distances + distance_gaps)
+        self.rate_estimates.append([histogram.mean for histogram in rates])
+        self.replacements = self.replacements + np.array([[histogram.successes, histogram.trials]
+                                                          for histogram in rates])
+
+        # The Wilson score intervals take the place of a lower bound of the variance of the rates
+        self.converged = bool(self.num_elections >= max(MIN_ELECTIONS, 2)
+                              and (half_widths(np.array(self.distance_estimates).T) <= CI_HALF_WIDTH).all()
+                              and (np.maximum(half_widths(np.array(self.rate_estimates).T, step=0),
+                                              wilson_half_widths(*self.replacements.T)) <= CI_HALF_WIDTH_EXP3).all())
+
+    @property
+    def num_elections(self):
+        return len(self.distance_estimates)
@@ -0,0 +1,181 @@
+import heapq
+import math
+from fractions import Fraction
+
+import numpy as np
+from abcvoting import scores
+from abcvoting.preferences import Profile
+
+from parameters import NUM_THREADS
+
+try:
+    from marginal_thiele_scores_cython import weighted_approval_sums
+except ImportError:  # Cython extension not built, see README.md
+    weighted_approval_sums = None
+
+
+# Dense approval profiles: a (num_voters x num_cand) boolean matrix, where entry [v, c] is True iff voter v approves
+# candidate c. All seqThiele computations below work on this matrix instead of abcvoting's Voter objects.
+
+def profile_to_matrix(profile):
+    approvals = np.zeros((len(profile), profile.num_cand), dtype=bool)
+    for v_idx, voter in enumerate(profile):
+        approvals[v_idx, list(voter.approved)] = True
+    return approvals
+
+
+def matrix_to_profile(approvals):
+    profile = Profile(approvals.shape[1])
+    profile.add_voters([np.flatnonzero(row).tolist() for row in approvals])
+    return profile
+
+
+def weighted_sums(weighted, approvals):
+    """
+    Return `weighted @ approvals` for voter weights of shape (num_voters,) or (num_rules, num_voters).
+
+    Dense matrices go through the GIL-free Cython kernel, which runs on NUM_THREADS threads, if it is built.
+    """
+    if weighted_approval_sums is None or not isinstance(approvals, np.ndarray):
+        return weighted @ approvals
+
+    weighted = np.asarray(weighted, dtype=np.int64)
+    sums = weighted_approval_sums(np.ascontiguousarray(np.atleast_2d(weighted)),
+                                  np.ascontiguousarray(approvals).view(np.uint8), NUM_THREADS)
+    return sums if weighted.ndim == 2 else sums[0]
+
+
+def thiele_weights(scorefct_id, committeesize):
+    """
+    Return the marginal score function of a Thiele method as an integer lookup table, together with its scale.
+
+    Entry i of the table is the marginal score of a voter's i-th approved committee member, multiplied by the least
+    common denominator of all entries. Integer weights keep all score comparisons exact, so ties are broken exactly as
+    in abcvoting, which compares Fractions.
+    """
+    marginal_scorefct = scores.get_marginal_scorefct(scorefct_id, committeesize)
+    fractions = [Fraction(0)] + [Fraction(marginal_scorefct(i)) for i in range(1, committeesize + 2)]
+    denominator = math.lcm(*(fraction.denominator for fraction in fractions))
+    weights = np.array([int(fraction * denominator) for fraction in fractions], dtype=np.int64)
+
+    return weights, denominator
+
+
+def marginal_thiele_scores_add_matrix(weights, approvals, counts, committee):
+    # counts[v] is the number of committee members approved by voter v
+    marginal = weighted_sums(weights[counts + 1], approvals)
+    marginal[committee] = -1
+
+    return marginal
+
+
+def seq_thiele_resolute_matrix(weights, approvals, committeesize, return_scores=False):
+    """
+    Compute one winning committee of a sequential Thiele method, in the order the candidates were chosen.
+
+    Ties are broken in favor of the candidate with the smallest index, as in abcvoting.
+    """
+    counts = np.zeros(approvals.shape[0], dtype=np.int64)
+    committee, delta_scores = [], []
+
+    for _ in range(committeesize):
+        marginal = marginal_thiele_scores_add_matrix(weights, approvals, counts, committee)
+        next_cand = int(np.argmax(marginal))  # argmax returns the first, i.e., smallest, maximizing index
+        committee.append(next_cand)
+        delta_scores.append(int(marginal[next_cand]))
+        counts += approvals[:, next_cand]
+
+    if return_scores:
+        return committee, delta_scores
+    else:
+        return committee
+
+
+def approving_voters(approvals, cand):
+    # Works on dense approval matrices and on `sparse_approvals.SparseApprovals`
+    if isinstance(approvals, np.ndarray):
+        return np.flatnonzero(approvals[:, cand])
+    else:
+        return approvals.column(cand)
+
+
+def seq_thiele_resolute_lazy(weights, approvals, committeesize, return_scores=False):
+    """
+    Compute the same committee as `seq_thiele_resolute_matrix` by lazy greedy (Minoux's accelerated greedy).
+
+    Since the weights are non-increasing, the marginal score of a candidate never increases as the committee grows, so
+    marginal scores from earlier rounds are upper bounds. Candidates are kept in a heap by their last computed marginal
+    score and index, and only the candidate at the top is recomputed, until it stays at the top. As the heap compares
+    (score, index) pairs, ties are still broken in favor of the smallest index. Falls back to recomputing all marginal
+    scores if the weights increase somewhere (e.g., for atleast-l Thiele methods).
+    """
+    if np.any(np.diff(weights[1:]) > 0):
+        return seq_thiele_resolute_matrix(weights, approvals, committeesize, return_scores)
+
+    counts = np.zeros(approvals.shape[0], dtype=np.int64)
+    marginal = weighted_sums(weights[counts + 1], approvals)
+    heap = [(-int(score), cand) for cand, score in enumerate(marginal)]
+    heapq.heapify(heap)
+    committee, delta_scores = [], []
+
+    for round_idx in range(committeesize):
+        while True:
+            _, cand = heapq.heappop(heap)
+            voters = approving_voters(approvals, cand)
+            # Scores of the first round are up to date
+            score = int(weights[counts[voters] + 1].sum()) if round_idx > 0 else int(marginal[cand])
+            if not heap or (-score, cand) <= heap[0]:
+                break
+            heapq.heappush(heap, (-score, cand))
+
+        committee.append(cand)
+        delta_scores.append(score)
+        counts[voters] += 1
+
+    if return_scores:
+        return committee, delta_scores
+    else:
+        return committee
+
+
+def stack_perturbations(baseline, flips):
+    """
+    Stack perturbed copies of `baseline` into a (batch, num_voters, num_cand) array.
+
+    Copy b has the entries with the flat indices flips[b] flipped, see `perturbations`.
+    """
+    stack = np.repeat(baseline[np.newaxis], len(flips), axis=0)
+    if len(flips) > 0:
+        offsets = np.arange(len(flips)) * baseline.size
+        stack.reshape(-1)[np.concatenate([offset + member_flips for offset, member_flips in zip(offsets, flips)])] ^= True
+
+    return stack
+
+
+def seq_thiele_resolute_batch(weights, approvals, committeesize):
+    """
+    Compute one winning committee for each of several sequential Thiele methods and each profile of a stack.
+
+    `weights` stacks one weight table per method (see `thiele_weights`), and `approvals` is a stack of approval matrices
+    (see `stack_perturbations`). Every round is a single batched matrix product followed by a per-profile argmax.
+    Returns an array of shape (num_rules, batch, committeesize), with candidates in the order they were chosen.
+    """
+    num_rules = len(weights)
+    batch_size, num_voters, _ = approvals.shape
+    # Floating point products run on BLAS, and are exact as long as all marginal scores stay below 2^53
+    dtype = np.float64 if int(weights.max()) * num_voters < 2 ** 53 else np.int64
+    matrices = approvals.astype(dtype)
+
+    rule_idxs = np.arange(num_rules)[:, np.newaxis, np.newaxis]
+    batch_idxs = np.arange(batch_size)[np.newaxis, :, np.newaxis]
+    counts = np.zeros((num_rules, batch_size, num_voters), dtype=np.int64)
+    committees = np.zeros((num_rules, batch_size, committeesize), dtype=np.int64)
+
+    for round_idx in range(committeesize):
+        weighted = weights[rule_idxs, counts + 1].astype(dtype)
+        marginal = (weighted[:, :, np.newaxis, :] @ matrices)[:, :, 0]
+        marginal[rule_idxs, batch_idxs, committees[:, :, :round_idx]] = -1
+        committees[:, :, round_idx] = np.argmax(marginal, axis=2)
+        counts += approvals[batch_idxs[:, :, 0], :, committees[:, :, round_idx]]
+
+    return committees
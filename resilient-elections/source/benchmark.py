@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+from importlib.metadata import version
+
+import numpy as np
+from abcvoting import abcrules, scores
+from numpy.random import default_rng
+
+# Keep abcvoting's own versions, which importing run_experiments replaces
+abcvoting_marginal_thiele_scores_add = scores.marginal_thiele_scores_add
+abcvoting_compute_seq_thiele_method = abcrules.compute_seq_thiele_method
+
+import run_experiments
+from approval_matrix import matrix_to_profile, seq_thiele_resolute_lazy, seq_thiele_resolute_matrix, thiele_weights
+from marginal_thiele_scores_cython import marginal_thiele_scores_add_cython
+from parameters import *
+from samplers import sample_approvals
+from tied_committees import seq_thiele_tied_committees
+from util import get_file_stem, get_seed_sequence
+
+# Micro benchmarks of the seqThiele hot paths on a grid of profile sizes, and macro benchmarks of whole elections.
+# Run `python3 benchmark.py` to write the timings to a JSON file in `benchmarks_directory_path`, and
+# `python3 benchmark.py --compare <file>` to compare fresh timings (or those of `--against <file>`) to earlier ones.
+
+GRID = [(100, 20), (1000, 100), (10000, 100), (1000, 1000)]  # (number of voters, number of candidates)
+QUICK_GRID = [(100, 20), (1000, 100)]
+GRID_PARAMS = SamplingParameters("Res", "", False, -1, 0.1, 0.75)  # profiles of the grid, about 10% approvals
+BENCHMARK_RULES = ["seqcc", "seqpav"]
+
+
+@contextmanager
+def unpatched_abcvoting():
+    # Temporarily undo the monkey patch of run_experiments.py, to time abcvoting as is
+    patched = scores.marginal_thiele_scores_add
+    scores.marginal_thiele_scores_add = abcvoting_marginal_thiele_scores_add
+    try:
+        yield
+    finally:
+        scores.marginal_thiele_scores_add = patched
+
+
+def time_call(function, repeats):
+    times = timeit.repeat(function, repeat=repeats, number=1)
+    return {"min": min(times), "median": statistics.median(times), "repeats": repeats}
+
+
+def benchmark_marginal_scores(approvals, repeats):
+    profile = matrix_to_profile(approvals)
+    committee = list(range(COMMITTEE_SIZE // 2))
+    results = []
+    for rule in BENCHMARK_RULES:
+        marginal_scorefct = scores.get_marginal_scorefct(rule[len("seq"):], COMMITTEE_SIZE)
+        results.append(({"name": "marginal_scores", "rule": rule, "implementation": "abcvoting"},
+                        time_call(lambda: abcvoting_marginal_thiele_scores_add(marginal_scorefct, profile, committee),
+                                  repeats)))
+        results.append(({"name": "marginal_scores", "rule": rule, "implementation": "cython"},
+                        time_call(lambda: marginal_thiele_scores_add_cython(marginal_scorefct, profile, committee),
+                                  repeats)))
+
+    return results
+
+
+def benchmark_seq_thiele(approvals, repeats):
+    profile = matrix_to_profile(approvals)
+    results = []
+    for rule in BENCHMARK_RULES:
+        scorefct_id = rule[len("seq"):]
+        weights, _ = thiele_weights(scorefct_id, COMMITTEE_SIZE)
+        for resolute in [True, False]:
+            name = "seq_thiele_resolute" if resolute else "seq_thiele_irresolute"
+            compute_abcvoting = lambda: abcvoting_compute_seq_thiele_method(
+                scorefct_id, profile, COMMITTEE_SIZE, algorithm="standard", resolute=resolute,
+                max_num_of_committees=None if resolute else MAX_NUM_COMMITTEES)
+            with unpatched_abcvoting():
+                results.append(({"name": name, "rule": rule, "implementation": "abcvoting"},
+                                time_call(compute_abcvoting, repeats)))
+            # abcvoting with the Cython marginal scores, as patched in run_experiments.py
+            results.append(({"name": name, "rule": rule, "implementation": "abcvoting+cython"},
+                            time_call(compute_abcvoting, repeats)))
+
+        results.append(({"name": "seq_thiele_resolute", "rule": rule, "implementation": "matrix"},
+                        time_call(lambda: seq_thiele_resolute_matrix(weights, approvals, COMMITTEE_SIZE), repeats)))
+        results.append(({"name": "seq_thiele_resolute", "rule": rule, "implementation": "lazy"},
+                        time_call(lambda: seq_thiele_resolute_lazy(weights, approvals, COMMITTEE_SIZE), repeats)))
+        results.append(({"name": "seq_thiele_irresolute", "rule": rule, "implementation": "matrix"},
+                        time_call(lambda: seq_thiele_tied_committees(weights, approvals, COMMITTEE_SIZE,
+                                                                     MAX_NUM_COMMITTEES), repeats)))
+
+    return results
+
+
+def benchmark_elections(num_iterations, repeats):
+    # One full election per parameter set, at the size configured in parameters.py
+    run_experiments.NUM_ITERATIONS = num_iterations
+    results = []
+    for params in parameter_list:
+        seed_sequence = lambda: get_seed_sequence(params, 0)  # fresh, since spawning changes a seed sequence
+        results.append(({"name": "run_one_election", "params": get_file_stem(params), "num_voters": NUM_VOTERS,
+                         "num_cand": NUM_CANDIDATES, "num_iterations": num_iterations},
+                        time_call(lambda: run_experiments.run_one_election(params, seed_sequence()), repeats)))
+
+    return results
+
+
+def run_benchmarks(grid, repeats, num_iterations):
+    results = []
+    for num_voters, num_cand in grid:
+        approvals = sample_approvals(GRID_PARAMS, default_rng(SEED), num_voters, num_cand)
+        for key, timing in benchmark_marginal_scores(approvals, repeats) + benchmark_seq_thiele(approvals, repeats):
+            results.append({**key, "num_voters": num_voters, "num_cand": num_cand, **timing})
+            print(f"{num_voters:>6} x {num_cand:<5} {key['name']:<22} {key['rule']:<7} {key['implementation']:<17} "
+                  f"{timing['median']:.5f}s")
+
+    for key, timing in benchmark_elections(num_iterations, repeats):
+        results.append({**key, **timing})
+        print(f"{key['name']:<22} {key['params']:<14} {timing['median']:.3f}s")
+
+    return results
+
+
+def benchmark_key(result):
+    # Identifies a benchmark across files
+    return tuple((field, result[field]) for field in
+                 ["name", "rule", "implementation", "params", "num_voters", "num_cand", "num_iterations"]
+                 if field in result)
+
+
+def compare(baseline, current, threshold):
+    """
+    Print the change of every benchmark in both files, and return the keys of those which got slower by more than
+    `threshold` (relative change of the median).
+    """
+    baseline_results = {benchmark_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = benchmark_key(result)
+        if key not in baseline_results:
+            continue
+        change = result["median"] / baseline_results[key]["median"] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{', '.join(str(value) for _, value in key):<70} {baseline_results[key]['median']:.5f}s -> "
+              f"{result['median']:.5f}s ({100 * change:+.1f}%) {flag}")
+        if change > threshold:
+            regressions.append(key)
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the seqThiele hot paths and whole elections")
+    parser.add_argument("--quick", action="store_true", help="small grid, one repetition and two iterations")
+    parser.add_argument("--output", help="file to write the results to (default: timestamped in benchmarks/)")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare to the results in this file")
+    parser.add_argument("--against", metavar="FILE", help="with --compare, use these results instead of running")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown reported as regression")
+    args = parser.parse_args()
+
+    if args.against:
+        with open(args.against) as fp:
+            current = json.load(fp)
+    else:
+        repeats, num_iterations = (1, 2) if args.quick else (3, NUM_ITERATIONS)
+        current = {
+            "meta": {"date": datetime.now().isoformat(), "platform": platform.platform(),
+                     "python": platform.python_version(), "numpy": np.__version__,
+                     "abcvoting": version("abcvoting"), "cpu_count": os.cpu_count(), "num_threads": NUM_THREADS},
+            "results": run_benchmarks(QUICK_GRID if args.quick else GRID, repeats, num_iterations),
+        }
+        output = args.output or f"{benchmarks_directory_path}/benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as fp:
+            json.dump(current, fp, indent=1)
+        print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower by more than {100 * args.threshold:.0f}%")
+            raise SystemExit(1)
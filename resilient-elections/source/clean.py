@@ -1,6 +1,7 @@
 import os
 
-from parameters import graphs_pdf_directory_path, graphs_png_directory_path, jsons_directory_path
+from parameters import arrays_directory_path, graphs_pdf_directory_path, graphs_png_directory_path, \
+    jsons_directory_path, shards_directory_path, summaries_directory_path
 
 
 def delete_files_in_directory(directory, containing=None):
@@ -35,3 +36,13 @@ if __name__ == "__main__":
     delete_files_in_directory(graphs_pdf_directory_path, containing)
     delete_files_in_directory(graphs_png_directory_path, containing)
     delete_files_in_directory(jsons_directory_path, containing)
+    # Stores hold one directory per parameter set (named by its file stem, which `containing` applies to) next to the
+    # settings they were run with (see util.check_settings), which are only deleted with all parameter sets
+    for store_path in (shards_directory_path, arrays_directory_path, summaries_directory_path):
+        delete_files_in_directory(store_path, containing)
+        if os.path.exists(store_path):
+            for store_directory in os.listdir(store_path):
+                if containing and any(c not in store_directory for c in containing):
+                    continue
+                if os.path.isdir(os.path.join(store_path, store_directory)):
+                    delete_files_in_directory(os.path.join(store_path, store_directory))
@@ -0,0 +1,44 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# Memoization of computations on perturbed profiles. A perturbed profile is identified by the set of entries flipped
+# relative to the baseline profile of its election: its fingerprint is the XOR of one pseudo-random 64-bit key per
+# flipped (voter, candidate) pair (Zobrist hashing), so the fingerprint of a profile with more flips is updated from
+# the previous one in time proportional to the new flips, and the baseline itself has fingerprint 0.
+
+
+def zobrist_keys(flat_idxs):
+    # splitmix64 of the flat indices (see `perturbations`), such that no table of keys of all entries is needed
+    with np.errstate(over="ignore"):
+        z = np.asarray(flat_idxs, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def fingerprint(flat_idxs, previous=0):
+    """Fingerprint of the profile in which `flat_idxs` are flipped on top of the profile with fingerprint `previous`."""
+    return previous ^ int(np.bitwise_xor.reduce(zobrist_keys(flat_idxs))) if len(flat_idxs) > 0 else previous
+
+
+class LRUCache:
+    def __init__(self, max_size):
+        """Mapping of at most `max_size` entries, evicting the least recently used one; `max_size` 0 turns it off."""
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        # Returns None on a miss
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        if self.max_size == 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
@@ -0,0 +1,105 @@
+import numpy as np
+
+from parameters import NUM_CANDIDATES, NUM_VOTERS, RULE_IDS
+from util import get_file_stem
+
+
+def estimate_cost(params):
+    """
+    Rough relative cost of one election before any has been timed: its expected share of approvals, which drives the
+    number of perturbations, and the number of ties.
+    """
+    match params.id:
+        case "1D":
+            return 2 * params.radius
+        case "2D":
+            return np.pi * params.radius ** 2
+        case "Res":
+            return params.rho
+        case _:
+            raise ValueError
+
+
+def election_features(results):
+    """Number of approvals and of tied committees (over all rules and iterations) of one election's results."""
+    num_approvals = results[RULE_IDS[0]]["EXP1"]["Approval_Counts"][0]
+    num_tied_committees = sum(num_tied for rule in RULE_IDS for ties in results[rule]["EXP2"]["MIX"].values()
+                              for num_tied, _ in ties)
+    return num_approvals, num_tied_committees
+
+
+def fit_non_negative(features, seconds):
+    """
+    Least squares fit of `seconds` to the columns of `features`, the first of which is constant, with non-negative
+    coefficients such that predicted times are never negative: the best fit among those on subsets of the columns.
+    """
+    scale = features.max(axis=0).clip(min=1)  # for conditioning, the numbers of approvals are large
+    best_coefficients, best_residual = None, np.inf
+    for columns in [[0, 1, 2], [0, 1], [0, 2], [1, 2], [1], [0]]:
+        coefficients = np.zeros(features.shape[1])
+        coefficients[columns], *_ = np.linalg.lstsq(features[:, columns] / scale[columns], seconds, rcond=None)
+        coefficients /= scale
+        residual = ((features @ coefficients - seconds) ** 2).sum()
+        if (coefficients >= 0).all() and residual < best_residual:
+            best_coefficients, best_residual = coefficients, residual
+
+    return best_coefficients
+
+
+class CostModel:
+    def __init__(self):
+        """
+        Online model of the time of one election, fitted by least squares to the elections timed so far as
+        seconds ~ a + b * (number of approvals) + c * (number of tied committees), with a, b, c >= 0. As long as only
+        elections of one parameter set are timed, times are taken proportional to `estimate_cost` instead.
+
+        For the elections of a parameter set, the features are the mean of those of its timed elections. Before any of
+        them is timed, the number of approvals is extrapolated from its expected share (`estimate_cost`) and the number
+        of tied committees from the ratio of tied committees to approvals of all timed elections.
+        """
+        self.features = {}  # file stem -> list of (1, number of approvals, number of tied committees)
+        self.seconds = {}  # file stem -> list of seconds
+        self.estimated_costs = {}  # file stem -> estimate_cost
+        self.coefficients = None
+        self.predictions = {}  # cache per file stem, cleared whenever an election is added
+
+    def add(self, params, seconds, num_approvals, num_tied_committees):
+        stem = get_file_stem(params)
+        self.features.setdefault(stem, []).append((1, num_approvals, num_tied_committees))
+        self.seconds.setdefault(stem, []).append(seconds)
+        self.estimated_costs[stem] = estimate_cost(params)
+        self.predictions = {}
+
+        features = np.array([row for rows in self.features.values() for row in rows], dtype=np.float64)
+        seconds = np.array([value for stem in self.features for value in self.seconds[stem]])
+        self.coefficients = fit_non_negative(features, seconds)
+
+    def predict(self, params):
+        """Expected seconds of one election of `params`, or its `estimate_cost` as long as none has been timed."""
+        stem = get_file_stem(params)
+        if stem in self.predictions:
+            return self.predictions[stem]
+
+        if self.coefficients is None:
+            prediction = estimate_cost(params)
+        elif len(self.features) == 1:
+            (timed_stem, seconds), = self.seconds.items()
+            prediction = np.mean(seconds) * estimate_cost(params) / self.estimated_costs[timed_stem]
+        elif stem in self.features:
+            prediction = np.mean(self.features[stem], axis=0) @ self.coefficients
+        else:
+            features = np.array([row for rows in self.features.values() for row in rows], dtype=np.float64)
+            num_approvals = estimate_cost(params) * NUM_VOTERS * NUM_CANDIDATES
+            ties_per_approval = features[:, 2].sum() / max(features[:, 1].sum(), 1)
+            prediction = np.array([1, num_approvals, ties_per_approval * num_approvals]) @ self.coefficients
+
+        self.predictions[stem] = max(float(prediction), 0.0)
+        return self.predictions[stem]
+
+    def order(self, tasks):
+        """Sort tasks (params, election index) by decreasing predicted time, stable within a parameter set."""
+        return sorted(tasks, key=lambda task: self.predict(task[0]), reverse=True)
+
+    def remaining_seconds(self, tasks):
+        # Predicted time of `tasks` in one process, None before any election has been timed
+        return sum(self.predict(params) for params, _ in tasks) if self.coefficients is not None else None
@@ -0,0 +1,219 @@
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import uuid
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from multiprocessing.pool import ThreadPool
+
+import parameters
+from util import get_file_stem, shared_settings
+
+# Distributed execution: a coordinator (`python3 run_experiments.py --coordinator`) leases elections to workers on any
+# host (`python3 run_experiments.py --worker <host>`), which run them on all their cores and send back the results.
+# An election is fully determined by its parameter set and index, from which the worker derives its seed.
+#
+# Every worker holds a lease on the elections it runs, which is renewed with every message it sends, at least every
+# HEARTBEAT_INTERVAL seconds. Elections of workers which disconnect, or whose leases are not renewed for LEASE_TIMEOUT
+# seconds (e.g., as their host is unreachable), are leased again. Results of elections which are done already are
+# dropped, such that every election is stored exactly once.
+#
+# Messages are pickled over TCP (multiprocessing.connection), and unpickling can run arbitrary code. Hence, the
+# coordinator only listens on COORDINATOR_HOST (by default, localhost), and both sides authenticate each other with a
+# secret, which is read from the environment variable named by COORDINATOR_AUTHKEY_VARIABLE and never has a default.
+
+def get_authkey():
+    authkey = os.environ.get(parameters.COORDINATOR_AUTHKEY_VARIABLE)
+    if not authkey:
+        raise ValueError(f"Set the secret shared by the coordinator and its workers in the environment variable "
+                         f"{parameters.COORDINATOR_AUTHKEY_VARIABLE}")
+    return authkey.encode()
+
+
+def get_task_key(params, election_idx):
+    # Parameter sets are not hashable
+    return get_file_stem(params), election_idx
+
+
+class Coordinator:
+    def __init__(self, tasks, cost_model, stopped):
+        """
+        Lease the elections `tasks` (params, election_idx) to the workers connecting to COORDINATOR_PORT, in order of
+        decreasing time predicted by `cost_model`, and skip those of parameter sets for which `stopped` becomes true,
+        as `run_experiments.run_tasks` does.
+        """
+        self.pending = list(tasks)
+        self.cost_model = cost_model
+        self.stopped = stopped
+        self.leases = {}  # task key -> (task, worker id, expiry time)
+        self.done = set()  # task keys
+        self.num_processes = {}  # worker id -> number of processes, of the connected workers
+        self.num_duplicates = 0
+        self.finished = False  # set once all tasks are done, which workers are then told
+        self.results = queue.Queue()
+        self.lock = threading.Lock()  # guards all of the above, which the connection threads share
+
+        self.listener = Listener((parameters.COORDINATOR_HOST, parameters.COORDINATOR_PORT), authkey=get_authkey())
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except AuthenticationError:
+                continue  # a client without the secret
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        # One thread per worker
+        worker_id = None
+        try:
+            while True:
+                message = connection.recv()
+                match message[0]:
+                    case "hello":
+                        _, worker_id, num_processes, settings = message
+                        if settings != shared_settings():
+                            connection.send(("error", "The settings in parameters.py differ from the coordinator's"))
+                            return
+                        with self.lock:
+                            self.num_processes[worker_id] = num_processes
+                        connection.send(("ok",))
+                    case "sync":
+                        _, results, num_wanted, held_task_keys = message
+                        connection.send(self._sync(worker_id, results, num_wanted, held_task_keys))
+                    case _:
+                        raise ValueError(f"Unknown message {message[0]}")
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+            # Elections of a disconnected worker are leased to other workers right away
+            with self.lock:
+                self.num_processes.pop(worker_id, None)
+                for task_key, (_, lease_worker_id, _) in list(self.leases.items()):
+                    if lease_worker_id == worker_id:
+                        self._release(task_key)
+
+    def _release(self, task_key):
+        task, _, _ = self.leases.pop(task_key)
+        self.pending.append(task)
+
+    def _sync(self, worker_id, results, num_wanted, held_task_keys):
+        with self.lock:
+            for result in results:
+                task_key = get_task_key(*result[:2])
+                if task_key in self.done:
+                    self.num_duplicates += 1
+                    continue
+                self.done.add(task_key)
+                if task_key in self.leases:
+                    del self.leases[task_key]
+                else:  # its lease had expired
+                    self.pending = [task for task in self.pending if get_task_key(*task) != task_key]
+                self.results.put(result)
+
+            expiry = time.monotonic() + parameters.LEASE_TIMEOUT
+            for task_key in held_task_keys:
+                if task_key in self.leases and self.leases[task_key][1] == worker_id:
+                    self.leases[task_key] = (self.leases[task_key][0], worker_id, expiry)
+
+            if self.finished:
+                return ("done",)
+            # `pending` is kept in order by the main thread, see `run`
+            leased, self.pending = self.pending[:num_wanted], self.pending[num_wanted:]
+            for task in leased:
+                self.leases[get_task_key(*task)] = (task, worker_id, expiry)
+            return ("tasks", leased)
+
+    def run(self):
+        """Yield the results of all tasks in any order, and markers for skipped tasks, as `run_tasks` does."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                for task_key, (_, _, expiry) in list(self.leases.items()):
+                    if expiry < now:
+                        self._release(task_key)
+
+                skipped = [(params, election_idx, None, None, None) for params, election_idx in self.pending
+                           if self.stopped(params)]
+                self.pending = self.cost_model.order([task for task in self.pending if not self.stopped(task[0])])
+                if not self.pending and not self.leases and not skipped and self.results.empty():
+                    self.finished = True
+                    return
+
+            yield from skipped
+            try:
+                yield self.results.get(timeout=parameters.HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def total_processes(self):
+        with self.lock:
+            return sum(self.num_processes.values())
+
+    def close(self):
+        self.listener.close()
+
+
+def connect(host):
+    # Workers may be started up to LEASE_TIMEOUT seconds before the coordinator
+    authkey = get_authkey()
+    deadline = time.monotonic() + parameters.LEASE_TIMEOUT
+    while True:
+        try:
+            return Client((host, parameters.COORDINATOR_PORT), authkey=authkey)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(parameters.HEARTBEAT_INTERVAL)
+
+
+def run_worker(host, run_task):
+    """
+    Run the elections leased by the coordinator on `host` with `run_task` (see `run_experiments.run_election_task`),
+    until the coordinator is done.
+    """
+    worker_id = uuid.uuid4().hex
+    num_processes = mp.cpu_count() if parameters.MULTIPROCESSING else 1
+    connection = connect(host)
+    connection.send(("hello", worker_id, num_processes, shared_settings()))
+    reply = connection.recv()
+    if reply[0] == "error":
+        raise ValueError(reply[1])
+
+    completed = queue.Queue()
+    running = set()  # task keys
+    results = []
+    # Without multiprocessing, elections run in a thread, such that this one keeps renewing their leases
+    with mp.Pool(processes=num_processes) if parameters.MULTIPROCESSING else ThreadPool(processes=1) as pool:
+        while True:
+            # As in `run_experiments.run_ordered`, at most two tasks per process are queued at any time
+            num_wanted = 2 * num_processes - len(running)
+            try:
+                connection.send(("sync", results, num_wanted, list(running)))
+                reply = connection.recv()
+            except (EOFError, OSError):
+                return  # the coordinator finished (or failed) before this worker synced again
+            if reply[0] == "done":
+                return
+
+            results = []
+            for params, election_idx in reply[1]:
+                running.add(get_task_key(params, election_idx))
+                pool.apply_async(run_task, ((params, election_idx, None),), callback=completed.put,
+                                 error_callback=completed.put)
+
+            # Sync again as soon as an election finishes, or to renew the leases
+            try:
+                results.append(completed.get(timeout=parameters.HEARTBEAT_INTERVAL))
+                while not completed.empty():
+                    results.append(completed.get())
+            except queue.Empty:
+                pass
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+                running.discard(get_task_key(*result[:2]))
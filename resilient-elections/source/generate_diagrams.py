@@ -1,11 +1,17 @@
-import statistics
+import hashlib
+import json
+import multiprocessing as mp
+import os
+from contextlib import nullcontext
+
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 
 from matplotlib.ticker import FuncFormatter
 
 from parameters import *
-from util import read_data
+from streaming_stats import summary_to_json
+from util import read_summary
 
 
 plt.rcParams["figure.figsize"] = [7.50, 3.50]
@@ -17,10 +23,6 @@ plt.rcParams['font.serif'] = ['Times New Roman']
 plt.rcParams.update({'font.size': 12})
 
 
-def flatten(xss):
-  return [x for xs in xss for x in xs]
-
-
 def get_plot_title(params, rule, avg_approvals):
   match params.id:
     case "1D" | "2D":
@@ -34,7 +36,7 @@ def get_plot_title(params, rule, avg_approvals):
       raise ValueError("Invalid preference id")
 
 
-def create_plots_EXP1(params, rule, filename):
+def create_plots_EXP1(params, rule, filename, results):
   match rule:
     case "seqcc":
       plt.figure(figsize=(4,3))
@@ -44,13 +46,12 @@ def create_plots_EXP1(params, rule, filename):
       raise ValueError
 
   results_avg_add, results_avg_del, results_avg_mix = [], [], []
-  results = read_data(jsons_directory_path, params)[rule]["EXP1"]
-  avg_approvals = statistics.mean(results["Approval_Counts"])
+  avg_approvals = results["Approval_Counts"].mean
 
   for percentage in percentage_changes:
-    results_avg_add.append(statistics.mean(flatten(results["ADD"][str(percentage)])))
-    results_avg_del.append(statistics.mean(flatten(results["DEL"][str(percentage)])))
-    results_avg_mix.append(statistics.mean(flatten(results["MIX"][str(percentage)])))
+    results_avg_add.append(results["ADD"][str(percentage)].mean)
+    results_avg_del.append(results["DEL"][str(percentage)].mean)
+    results_avg_mix.append(results["MIX"][str(percentage)].mean)
 
   plt.ylim([-0.1, 7.1])
   plt.yticks(np.arange(0, 8, 1))
@@ -87,7 +88,7 @@ def create_plots_EXP1(params, rule, filename):
 
 
 
-def create_plots_EXP2(params, rule, filename):
+def create_plots_EXP2(params, rule, filename, results):
   match rule:
     case "seqcc":
       plt.figure(figsize=(4, 3))
@@ -97,8 +98,7 @@ def create_plots_EXP2(params, rule, filename):
       raise ValueError
 
   dists_to_opt = []
-  results = read_data(jsons_directory_path, params)[rule]["EXP2"]
-  avg_approvals = statistics.mean(results["Approval_Counts"])
+  avg_approvals = results["Approval_Counts"].mean
 
   # declutter by dropping 0 and only taking every third value
   #local_percentage_changes = [pqercentage for i, percentage in enumerate(percentage_changes) if i % 3 == 1]
@@ -107,10 +107,9 @@ def create_plots_EXP2(params, rule, filename):
   local_percentage_changes = [0.001, 0.013, 0.033, 0.062, 0.1]
 
 
+  # Box plots are drawn from the histograms of the summaries, see streaming_stats.IntegerHistogram.boxplot_stats
   for percentage in local_percentage_changes:
-    num_ties = list(map(lambda x: x[0], flatten(results["MIX"][str(percentage)])))
-    dists = list(map(lambda x: x[1], flatten(results["MIX"][str(percentage)])))
-    dists_to_opt.append(dists)
+    dists_to_opt.append(results["MIX"][str(percentage)]["Distance_Gaps"].boxplot_stats())
 
   #plt.ylim([-0.1, 10.1])
 
@@ -121,7 +120,7 @@ def create_plots_EXP2(params, rule, filename):
 
   #plt.title(get_plot_title(params, rule, avg_approvals))
 
-  plt.boxplot(dists_to_opt, showmeans=True, meanline=True)
+  plt.gca().bxp(dists_to_opt, showmeans=True, meanline=True)
   plt.xticks(range(1, len(local_percentage_changes) + 1), map(lambda x: f"{round(x*100, 2)}%", local_percentage_changes), fontsize=12)
 
   #plt.plot([], [], '--', linewidth=1, color='green', label='mean')
@@ -145,7 +144,7 @@ def create_plots_EXP2(params, rule, filename):
   plt.rcParams['text.usetex'] = False
 
 
-def create_plots_EXP3(params, rule, filename):
+def create_plots_EXP3(params, rule, filename, results):
   match rule:
     case "seqcc":
       plt.figure(figsize=(4, 3))
@@ -156,8 +155,7 @@ def create_plots_EXP3(params, rule, filename):
 
   percentage = percentage_changes[7] # TODO: corresponds to 0.025
 
-  results = read_data(jsons_directory_path, params)[rule]["EXP3"]
-  avg_approvals = statistics.mean(results["Approval_Counts"])
+  avg_approvals = results["Approval_Counts"].mean
 
   plt.ylim([-1, 101])
   plt.yticks(np.arange(0, 101, 25))
@@ -166,9 +164,9 @@ def create_plots_EXP3(params, rule, filename):
 
   #plt.title(get_plot_title(params, rule, avg_approvals))
 
-  exchange_percentages = [[100*x/NUM_ITERATIONS for x in sub] for sub in results["MIX"][str(percentage)]]
+  exchange_percentages = [histogram.boxplot_stats(scale=100) for histogram in results["MIX"][str(percentage)]]
 
-  plt.boxplot(list(zip(*exchange_percentages)), showmeans=True, meanline=True)
+  plt.gca().bxp(exchange_percentages, showmeans=True, meanline=True)
 
 
   match rule:
@@ -189,22 +187,77 @@ def create_plots_EXP3(params, rule, filename):
   plt.close()
 
 
-if __name__ == '__main__':
+def get_filename(params, rule):
+  match params.id:
+    case "1D" | "2D":
+      if params.euclid_resample:
+        return f"{rule}_{params.id}+res_{params.radius}"
+      else:
+        return f"{rule}_{params.id}_{params.radius}"
+    case "Res":
+      return f"{rule}_{params.id}_{params.rho}_{params.phi}"
+    case _:
+      raise ValueError
+
+
+# Rules with labels and colors in the plots, other rules in RULE_IDS are not plotted
+PLOTTED_RULE_IDS = ["seqcc", "seqpav"]
+
 
+def get_plot_tasks():
+  # Every results file is read once, and its summary is split up into the data of the single plots
   for params in parameter_list:
-    for rule in RULE_IDS:
-
-      match params.id:
-        case "1D" | "2D":
-          if params.euclid_resample:
-            filename = f"{rule}_{params.id}+res_{params.radius}"
-          else:
-            filename = f"{rule}_{params.id}_{params.radius}"
-        case "Res":
-          filename = f"{rule}_{params.id}_{params.rho}_{params.phi}"
-        case _:
-          raise ValueError
-
-      create_plots_EXP1(params, rule, "EXP1_" + filename)
-      create_plots_EXP2(params, rule, "EXP2_" + filename)
-      create_plots_EXP3(params, rule, "EXP3_" + filename)
+    summary = read_summary(params)
+    for rule in [rule for rule in RULE_IDS if rule in PLOTTED_RULE_IDS]:
+      for exp, create_plots in [("EXP1", create_plots_EXP1), ("EXP2", create_plots_EXP2), ("EXP3", create_plots_EXP3)]:
+        yield create_plots, params, rule, f"{exp}_{get_filename(params, rule)}", summary[rule][exp]
+
+
+with open(__file__, "rb") as fp:
+  source_hash = hashlib.sha256(fp.read()).hexdigest()
+
+
+def get_input_hash(filename, results):
+  # Changes whenever the data of a plot, or the code plotting it, changes
+  data = json.dumps([source_hash, filename, NUM_ITERATIONS, summary_to_json(results)], sort_keys=True)
+  return hashlib.sha256(data.encode()).hexdigest()
+
+
+def is_rendered(filename, input_hash, render_hashes):
+  return (render_hashes.get(filename) == input_hash and os.path.exists(graphs_png_directory_path + filename + '.png')
+          and os.path.exists(graphs_pdf_directory_path + filename + '.pdf'))
+
+
+def init_plot_worker():
+  plt.switch_backend("Agg")  # workers never show plots
+
+
+def render_plot(task):
+  create_plots, params, rule, filename, results = task
+  create_plots(params, rule, filename, results)
+  return filename
+
+
+if __name__ == '__main__':
+
+  # Plots whose data did not change since they were last rendered are skipped
+  render_hashes = {}
+  if os.path.exists(graphs_render_hashes_path):
+    with open(graphs_render_hashes_path) as fp:
+      render_hashes = json.load(fp)
+
+  tasks, input_hashes = [], {}
+  for task in get_plot_tasks():
+    _, _, _, filename, results = task
+    input_hashes[filename] = get_input_hash(filename, results)
+    if not is_rendered(filename, input_hashes[filename], render_hashes):
+      tasks.append(task)
+  print(f"Rendering {len(tasks)} out of {len(input_hashes)} plots, the others are up to date.")
+
+  os.makedirs(graphs_png_directory_path, exist_ok=True)
+  os.makedirs(graphs_pdf_directory_path, exist_ok=True)
+  with mp.Pool(processes=mp.cpu_count(), initializer=init_plot_worker) if MULTIPROCESSING else nullcontext() as p:
+    for filename in (p.imap_unordered(render_plot, tasks) if p is not None else map(render_plot, tasks)):
+      render_hashes[filename] = input_hashes[filename]
+      with open(graphs_render_hashes_path, "w") as fp:
+        json.dump(render_hashes, fp, indent=1, sort_keys=True)
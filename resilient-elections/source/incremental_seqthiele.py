@@ -0,0 +1,140 @@
+import numpy as np
+
+from approval_matrix import weighted_sums
+
+
+# Incremental seqThiele: keeps the per-voter intersection counts and the marginal score vector of every greedy round,
+# such that approval flips only touch the affected voters, and the greedy procedure is replayed only from the first
+# round whose choice changed. Replayed rounds again only update the marginal scores of the voters whose counts changed.
+# Several Thiele methods are handled together, sharing every pass over the approval matrix.
+
+class IncrementalSeqThiele:
+    def __init__(self, weights, approvals, committeesize):
+        """
+        Greedy committees of sequential Thiele methods on `approvals`, which is shared with (and mutated by) the caller.
+
+        `weights` stacks one integer weight table per Thiele method, as returned by `approval_matrix.thiele_weights`.
+        """
+        self.weights = np.atleast_2d(weights)
+        self.approvals = approvals
+        self.committeesize = committeesize
+
+        num_rules = len(self.weights)
+        num_voters, num_cand = approvals.shape
+        # counts before each round and unmasked marginal scores of each round, per rule
+        self.counts = np.zeros((num_rules, committeesize, num_voters), dtype=np.int64)
+        self.marginals = np.zeros((num_rules, committeesize, num_cand), dtype=np.int64)
+        self.committees = [[0] * committeesize for _ in range(num_rules)]  # candidates in the order they were chosen
+        self.rounds = np.arange(committeesize)[:, np.newaxis]
+        self.earlier_rounds = np.tril_indices(committeesize, -1)  # (round, earlier round) pairs
+
+        self._compute()
+
+    def copy(self):
+        other = object.__new__(IncrementalSeqThiele)
+        other.weights, other.approvals, other.committeesize = self.weights, self.approvals, self.committeesize
+        other.rounds, other.earlier_rounds = self.rounds, self.earlier_rounds
+        other.counts, other.marginals = self.counts.copy(), self.marginals.copy()
+        other.committees = [list(committee) for committee in self.committees]
+        return other
+
+    def restore(self, other):
+        # Reset to the state of `other` (e.g., a copy taken before perturbing the profile) without allocating
+        np.copyto(self.counts, other.counts)
+        np.copyto(self.marginals, other.marginals)
+        for committee, other_committee in zip(self.committees, other.committees):
+            committee[:] = other_committee
+
+    def _masked_argmax(self, rule_idx, round_idx):
+        masked = self.marginals[rule_idx, round_idx].copy()
+        masked[self.committees[rule_idx][:round_idx]] = -1
+        return int(np.argmax(masked))  # smallest index among the maximizers, as in abcvoting
+
+    def _compute(self):
+        # All rounds of all rules from scratch
+        counts = np.zeros((len(self.weights), self.approvals.shape[0]), dtype=np.int64)
+        for round_idx in range(self.committeesize):
+            weighted = np.stack([self.weights[rule_idx][counts[rule_idx] + 1] for rule_idx in range(len(self.weights))])
+            self.marginals[:, round_idx] = weighted_sums(weighted, self.approvals)
+
+            for rule_idx in range(len(self.weights)):
+                self.counts[rule_idx, round_idx] = counts[rule_idx]
+                next_cand = self._masked_argmax(rule_idx, round_idx)
+                self.committees[rule_idx][round_idx] = next_cand
+                counts[rule_idx] += self.approvals[:, next_cand]
+
+    def _replay(self, rule_idx, start_round):
+        # Recompute the rounds of a rule from `start_round` on, whose counts and marginal scores are up to date. Replayed
+        # rounds only update the marginal scores of the voters whose counts changed
+        weights, committee = self.weights[rule_idx], self.committees[rule_idx]
+        counts = self.counts[rule_idx, start_round].copy()
+        for round_idx in range(start_round, self.committeesize):
+            old_counts = self.counts[rule_idx, round_idx]
+            changed = np.flatnonzero(counts != old_counts)
+            if len(changed) > 0:
+                delta = weights[counts[changed] + 1] - weights[old_counts[changed] + 1]
+                self.marginals[rule_idx, round_idx] += delta @ self.approvals[changed]
+                self.counts[rule_idx, round_idx] = counts
+
+            next_cand = self._masked_argmax(rule_idx, round_idx)
+            committee[round_idx] = next_cand
+            counts += self.approvals[:, next_cand]
+
+    def update(self, voters, old_rows, rule_idxs=None):
+        """
+        Account for changed approval rows of `voters`, which previously were `old_rows`.
+
+        See `perturbations.PerturbationBuffer.apply`, which returns both. Only the rules `rule_idxs` (by default all)
+        follow the change, the others fall behind and have to be restored (see `restore`) before they are used again.
+        """
+        rule_idxs = np.arange(len(self.weights)) if rule_idxs is None else np.asarray(rule_idxs, dtype=np.int64)
+        if len(voters) == 0 or len(rule_idxs) == 0:
+            return
+
+        new_rows = self.approvals[voters]
+        committees = np.array([self.committees[rule_idx] for rule_idx in rule_idxs])
+        rules = rule_idxs[:, np.newaxis, np.newaxis]
+
+        # Counts of all rounds for the affected voters: number of approved members among the first r chosen candidates
+        new_counts = np.zeros((len(rule_idxs), self.committeesize, len(voters)), dtype=np.int64)
+        np.cumsum(new_rows[:, committees[:, :-1]].transpose(1, 2, 0), axis=1, out=new_counts[:, 1:])
+        old_counts = self.counts[rules, self.rounds, voters]
+
+        marginals = self.marginals[rule_idxs]
+        marginals += self.weights[rules, new_counts + 1] @ new_rows - self.weights[rules, old_counts + 1] @ old_rows
+        self.marginals[rule_idxs] = marginals
+        self.counts[rules, self.rounds, voters] = new_counts
+
+        # Rounds before the first diverging one keep their choice, and hence their counts and marginal scores
+        rounds, earlier_rounds = self.earlier_rounds
+        marginals[np.arange(len(rule_idxs))[:, np.newaxis], rounds, committees[:, earlier_rounds]] = -1
+        diverged = marginals.argmax(axis=2) != committees
+        for rule_idx, rule_diverged in zip(rule_idxs.tolist(), diverged):
+            if rule_diverged.any():
+                self._replay(rule_idx, int(rule_diverged.argmax()))
+
+    def update_entry(self, voter, cand, rule_idxs=None):
+        """
+        Account for the flipped approval of `voter` for `cand`, as `update` does for whole approval rows.
+        """
+        rule_idxs = np.arange(len(self.weights)) if rule_idxs is None else np.asarray(rule_idxs, dtype=np.int64)
+        if any(cand in self.committees[rule_idx] for rule_idx in rule_idxs):
+            old_row = self.approvals[voter].copy()
+            old_row[cand] = not old_row[cand]
+            self.update(np.array([voter]), old_row[np.newaxis], rule_idxs)
+            return
+
+        # The counts stay the same, so only the marginal scores of `cand` change. A removed approval cannot make it
+        # chosen, an added one diverges from the first round in which it overtakes the chosen candidate
+        weights = self.weights[rule_idxs[:, np.newaxis], self.counts[rule_idxs, :, voter] + 1]
+        if not self.approvals[voter, cand]:
+            self.marginals[rule_idxs, :, cand] -= weights
+            return
+        self.marginals[rule_idxs, :, cand] += weights
+        committees = np.array([self.committees[rule_idx] for rule_idx in rule_idxs])
+        chosen_scores = self.marginals[rule_idxs[:, np.newaxis], self.rounds[:, 0], committees]
+        cand_scores = self.marginals[rule_idxs, :, cand]
+        diverged = (cand_scores > chosen_scores) | ((cand_scores == chosen_scores) & (cand < committees))
+        for rule_idx, rule_diverged in zip(rule_idxs.tolist(), diverged):
+            if rule_diverged.any():
+                self._replay(rule_idx, int(rule_diverged.argmax()))
@@ -0,0 +1,88 @@
+import cProfile
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from parameters import PROFILE_PHASES, PROFILE_WORKERS, profiles_directory_path
+
+# Opt-in instrumentation of `run_experiments.run_one_election`: named timers of its phases and counters (e.g., of
+# seqThiele calls), which workers return with their results and the main process merges per parameter set.
+
+PHASES = ["sampling", "sample_spaces", "perturbations", "resolute", "ties", "stability_radii", "bookkeeping"]
+
+
+class PhaseStats:
+    def __init__(self, timers=None, counters=None):
+        self.timers = Counter(timers)  # seconds spent per phase
+        self.counters = Counter(counters)
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def phase(self, name):
+        # Phases must not be nested, as the time of the elections not covered by any phase is attributed to bookkeeping
+        return self._timed(name) if PROFILE_PHASES else nullcontext()
+
+    def count(self, name, n=1):
+        if PROFILE_PHASES:
+            self.counters[name] += n
+
+    def merge(self, other):
+        self.timers.update(other.timers)
+        self.counters.update(other.counters)
+
+    def format(self):
+        num_elections = max(self.counters["elections"], 1)
+        total = sum(self.timers.values())
+        lines = [f"{name:<14} {self.timers[name]:10.2f}s {100 * self.timers[name] / max(total, 1e-9):5.1f}% "
+                 f"{self.timers[name] / num_elections:8.4f}s per election" for name in PHASES]
+        lines += [f"{name:<22} {count:>10} {count / num_elections:10.1f} per election"
+                  for name, count in sorted(self.counters.items()) if name != "elections"]
+        return "\n".join(lines)
+
+
+election_stats = PhaseStats()  # of the election currently run by this process
+
+
+@contextmanager
+def election_phases():
+    """Reset `election_stats` and time one election, whose time outside of the phases is counted as bookkeeping."""
+    election_stats.timers.clear()
+    election_stats.counters.clear()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if PROFILE_PHASES:
+            election_stats.timers["bookkeeping"] += time.perf_counter() - start - sum(election_stats.timers.values())
+            election_stats.count("elections")
+
+
+worker_profiler = None
+
+
+def profile_worker(function, *args):
+    """
+    Call `function` under one cProfile profiler per process if PROFILE_WORKERS is on, whose cumulative statistics are
+    written to `profiles_directory_path/worker_<pid>.prof` after every call (pool workers are terminated without
+    notice). Inspect them with, e.g., `python3 -m pstats`.
+    """
+    global worker_profiler
+    if not PROFILE_WORKERS:
+        return function(*args)
+
+    if worker_profiler is None:
+        worker_profiler = cProfile.Profile()
+    worker_profiler.enable()
+    try:
+        return function(*args)
+    finally:
+        worker_profiler.disable()
+        os.makedirs(profiles_directory_path, exist_ok=True)
+        worker_profiler.dump_stats(f"{profiles_directory_path}/worker_{os.getpid()}.prof")
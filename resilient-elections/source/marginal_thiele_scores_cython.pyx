@@ -1,36 +1,59 @@
+# cython: boundscheck=False, wraparound=False
+from fractions import Fraction
+import math
+
+import numpy as np
+
 cimport cython
+from cython.parallel cimport prange, threadid
+from libc.stdint cimport int64_t, uint8_t
+
+
+def weighted_approval_sums(const int64_t[:, ::1] weighted, const uint8_t[:, ::1] approvals, int num_threads=1):
+    """
+    Return weighted @ approvals for integer voter weights of shape (num_rules, num_voters) and a dense approval matrix
+    (viewed as uint8, see `approval_matrix`), i.e., the marginal scores of all candidates for each rule.
+
+    Runs without the GIL, with voters split among `num_threads` threads. Each thread sums into its own rows, which are
+    added up at the end.
+    """
+    cdef Py_ssize_t num_rules = weighted.shape[0]
+    cdef Py_ssize_t num_voters = approvals.shape[0]
+    cdef Py_ssize_t num_cand = approvals.shape[1]
+    cdef Py_ssize_t v, r, c, t
+    cdef int64_t w
+
+    num_threads = max(1, min(num_threads, num_voters))
+    partial_sums = np.zeros((num_threads, num_rules, num_cand), dtype=np.int64)
+    cdef int64_t[:, :, ::1] partial = partial_sums
+
+    for v in prange(num_voters, nogil=True, num_threads=num_threads, schedule="static"):
+        t = threadid()
+        for r in range(num_rules):
+            w = weighted[r, v]
+            if w != 0:  # e.g., all voters with an approved committee member for CC
+                for c in range(num_cand):
+                    partial[t, r, c] += w * approvals[v, c]
+
+    return partial_sums.sum(axis=0)
+
 
-@cython.boundscheck(False)
-@cython.wraparound(False)
 def marginal_thiele_scores_add_cython(marginal_scorefct, profile, committee):
-    cdef int num_cand = profile.num_cand
-    cdef list marginal = [0] * num_cand
-    cdef int intersectionsize
-    cdef marginal_score  # can't be int, since fractions then get rounded to 0, i.e., pav == cc
-    cdef int cand
-    cdef double weight
-
-    cdef list first_few_scores = [marginal_scorefct(i) for i in range(len(committee) + 2)]
-    def precomputed_marginal_scorefct(i):
-        if i < len(first_few_scores):
-            return first_few_scores[i]
-        else:
-            raise RuntimeError  #return marginal_scorefct(i) <- don't need this, in case we precompute sufficiently many
-
-    # Convert committee to a set for faster membership checks
-    cdef set committee_set = set(committee)
-
-    for voter in profile:
-        intersectionsize = 0
-        for cand in voter.approved:
-            if cand in committee_set:
-                intersectionsize += 1
-
-        marginal_score = precomputed_marginal_scorefct(intersectionsize + 1)  # 25% of runtime in original program
-        # => avoid recomputing for every candidate
-        for cand in voter.approved:
-            marginal[cand] += marginal_score
+    # Replacement of abcvoting.scores.marginal_thiele_scores_add, returning the same (exact) marginal scores
+    approved = [list(voter.approved) for voter in profile]
+    approvals = np.zeros((len(profile), profile.num_cand), dtype=np.uint8)
+    approvals[np.repeat(np.arange(len(approved)), [len(cands) for cands in approved]),
+              [cand for cands in approved for cand in cands]] = 1
+
+    # Integer weight table, scaled by the common denominator of the marginal scores
+    fractions = [Fraction(marginal_scorefct(i)) for i in range(len(committee) + 2)]
+    denominator = math.lcm(*(fraction.denominator for fraction in fractions))
+    weights = np.array([int(fraction * denominator) for fraction in fractions], dtype=np.int64)
+
+    counts = approvals[:, list(committee)].sum(axis=1, dtype=np.int64)
+    marginal = weighted_approval_sums(weights[counts + 1][np.newaxis], approvals)[0]
 
+    marginal = [Fraction(int(score), denominator) if denominator > 1 else int(score) for score in marginal]
     for cand in committee:
         marginal[cand] = -1
 
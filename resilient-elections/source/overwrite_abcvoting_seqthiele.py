@@ -1,10 +1,14 @@
+from fractions import Fraction
+
 from abcvoting import scores
-from abcvoting.abcrules import Rule, UnknownAlgorithm, _seq_thiele_irresolute, ALGORITHM_NAMES, \
-    MAX_NUM_OF_COMMITTEES_DEFAULT
+from abcvoting.abcrules import Rule, UnknownAlgorithm, ALGORITHM_NAMES, MAX_NUM_OF_COMMITTEES_DEFAULT
 from abcvoting.misc import sorted_committees
 from abcvoting.misc import str_committees_with_header, header, str_set_of_candidates
 from abcvoting.output import output, DETAILS
 
+from approval_matrix import profile_to_matrix, seq_thiele_resolute_matrix, thiele_weights
+from tied_committees import seq_thiele_tied_committees
+
 
 # Adapt abcvotings computation of seqThiele to also return order in which candidates were chosen
 
@@ -76,9 +80,10 @@ def compute_seq_thiele_method_return_order(
             committees, detailed_info, COMMITTEE = _seq_thiele_resolute_return_order(scorefct_id, profile,
                                                                                      committeesize)
         else:
-            committees, detailed_info = _seq_thiele_irresolute(
-                scorefct_id, profile, committeesize, max_num_of_committees
-            )
+            weights, _ = thiele_weights(scorefct_id, committeesize)
+            committees = seq_thiele_tied_committees(weights, profile_to_matrix(profile), committeesize,
+                                                    max_num_of_committees)
+            detailed_info = {}
     else:
         raise UnknownAlgorithm(rule_id, algorithm)
 
@@ -143,29 +148,13 @@ def _seq_thiele_resolute_return_order(scorefct_id, profile, committeesize):
 
     Tiebreaking between candidates in favor of candidate with smaller
     number/index (candidates with larger numbers get deleted first).
+    Runs greedy on the dense approval matrix of the profile, see `approval_matrix`. Lazy greedy only pays off on sparse
+    profiles: on dense ones, its heap costs more than the full passes it saves.
     """
-    committee = []
-    marginal_scorefct = scores.get_marginal_scorefct(scorefct_id, committeesize)
-    detailed_info = {"next_cand": [], "tied_cands": [], "delta_score": []}
-
-    # build a committee starting with the empty set
-    for _ in range(committeesize):
-        additional_score_cand = scores.marginal_thiele_scores_add(
-            marginal_scorefct, profile, committee
-        )
-        """
-        tied_cands = [
-            cand
-            for cand in range(len(additional_score_cand))
-            if additional_score_cand[cand] == max(additional_score_cand)
-        ]
-        next_cand = tied_cands[0]  # tiebreaking in favor of candidate with smallest index
-        """
-        # Do equivalent but more efficient version
-        next_cand = max(enumerate(additional_score_cand), key=lambda x: x[1])[0]
-        committee.append(next_cand)
-        detailed_info["next_cand"].append(next_cand)
-        # detailed_info["tied_cands"].append(tied_cands)
-        detailed_info["delta_score"].append(max(additional_score_cand))
+    weights, denominator = thiele_weights(scorefct_id, committeesize)
+    committee, delta_scores = seq_thiele_resolute_matrix(weights, profile_to_matrix(profile), committeesize,
+                                                         return_scores=True)
+    detailed_info = {"next_cand": committee, "tied_cands": [],
+                     "delta_score": [Fraction(delta_score, denominator) for delta_score in delta_scores]}
 
     return sorted_committees([committee]), detailed_info, committee
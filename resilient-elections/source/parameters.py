@@ -10,6 +10,14 @@ COMMITTEE_SIZE = 10
 NUM_ELECTIONS = 100  # Number of elections per radius
 NUM_ITERATIONS = 100  # Number of augmented preferences to generate and compute distance of, for each instance
 MAX_NUM_COMMITTEES = 100  # Number of tied committees considered in EXP2
+SEED = 0  # Root seed of all random streams, see util.get_seed_sequence
+EXP2_EXACT_TIE_COUNTS = True  # Turn off to prune EXP2 tie enumeration; tie counts then only cover unpruned branches
+STABILITY_RADII = False  # Also find the fewest flips changing the committees (EXP4, stability_radius.py)
+ADAPTIVE_SAMPLING = False  # Stop sampling iterations and elections once estimates are precise (adaptive_sampling.py)
+CI_HALF_WIDTH = 0.1  # With ADAPTIVE_SAMPLING: target 95% CI half-width of mean distances and distance gaps
+CI_HALF_WIDTH_EXP3 = 0.02  # ... and of replacement rates (EXP3)
+MIN_ITERATIONS = 10  # Iterations per election with ADAPTIVE_SAMPLING, where NUM_ITERATIONS is the maximum
+MIN_ELECTIONS = 10  # Elections per radius with ADAPTIVE_SAMPLING, where NUM_ELECTIONS is the maximum
 
 percentage_power = 2
 max_percentage = .1
@@ -20,14 +28,36 @@ percentage_changes = list(map(lambda x: round(x, 3),
 this_directory = str(pathlib.Path(__file__).parent.resolve())
 parent_directory = this_directory + "/.."
 jsons_directory_path = parent_directory + "/jsons"
+shards_directory_path = parent_directory + "/shards"  # Results of single elections, see util.write_shard
+arrays_directory_path = parent_directory + "/arrays"  # Columnar result stores, see result_store.py
+summaries_directory_path = parent_directory + "/summaries"  # Streaming summaries, see streaming_stats.py
+benchmarks_directory_path = parent_directory + "/benchmarks"  # Timings written by benchmark.py
+profiles_directory_path = parent_directory + "/profiles"  # cProfile dumps of workers, see instrumentation.py
 graphs_pdf_directory_path = parent_directory + "/graphs/pdfs/"
 graphs_png_directory_path = parent_directory + "/graphs/pngs/"
+graphs_render_hashes_path = parent_directory + "/graphs/render_hashes.json"  # see generate_diagrams.py
 
 PREF_IDS = ["1D", "2D", "Res"]
-RULE_IDS = ["seqcc", "seqpav"]
+RULE_IDS = ["seqcc", "seqpav"]  # Any sequential Thiele rules, e.g., "seqslav"; generate_diagrams.py skips others
 
 MULTIPROCESSING = True  # Turn off for debugging purposes
+NUM_THREADS = 1  # Threads of the Cython marginal score kernel per process, e.g., all cores for one large election
 WRITE_DATA = True  # Turn off for debugging purposes
+RESULT_STORE = "json"  # "json": one nested JSON file per parameter set, "npy": memory-mapped arrays (result_store.py),
+# "summary": only streaming statistics per parameter set, which suffice for generate_diagrams.py (streaming_stats.py)
+BATCHED_EVALUATION = True  # Evaluate all perturbation levels of an operation as one stack; turn off for large profiles
+SPARSE_PROFILES = False  # Sparse approval profiles for large electorates (sparse_approvals.py), see README.md
+SHARED_PROFILES = False  # Sample (dense) profiles in the main process into memory-mapped files, which workers attach to
+PROFILE_BATCH_SIZE = 64  # Number of profiles per memory-mapped file if SHARED_PROFILES is on
+RESULT_QUEUE_SIZE = 16  # Results waiting to be stored by a thread (pipeline.py) before no more elections are started
+COMMITTEE_CACHE_SIZE = 4096  # Entries of the per-election caches of committees and ties (committee_cache.py), 0: off
+PROFILE_PHASES = False  # Time the phases of every election and print them per parameter set (instrumentation.py)
+PROFILE_WORKERS = False  # Write the cProfile statistics of every worker to profiles_directory_path
+COORDINATOR_HOST = "localhost"  # Interface the coordinator of distributed runs listens on (distributed.py), "" for all
+COORDINATOR_PORT = 6000  # TCP port of the coordinator, which must only be reachable by trusted hosts
+COORDINATOR_AUTHKEY_VARIABLE = "RESILIENT_ELECTIONS_AUTHKEY"  # Environment variable holding the coordinator's secret
+LEASE_TIMEOUT = 600  # Seconds after which the elections of a worker which stopped syncing are leased again
+HEARTBEAT_INTERVAL = 10  # Seconds between the syncs of an idle worker, must be well below LEASE_TIMEOUT
 
 
 @dataclass
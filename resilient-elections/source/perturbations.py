@@ -0,0 +1,67 @@
+import numpy as np
+
+
+# Perturbations of dense approval matrices (see `approval_matrix`). Approvals are addressed by their flat index
+# voter_idx * num_cand + cand_idx, and every perturbation is a batch of flips, i.e., added or removed approvals.
+
+def sample_entries(rng, approvals, value, k):
+    """
+    Sample `k` distinct flat indices of entries of `approvals` equal to `value`, uniformly at random and in random order.
+
+    Equivalent to `random.sample` over the list of all such (voter, candidate) pairs, but uses rejection sampling, so the
+    sample space is never materialized.
+    """
+    flat = approvals.reshape(-1)
+    num_matching = np.count_nonzero(flat) if value else flat.size - np.count_nonzero(flat)
+    if k > num_matching:
+        raise ValueError("Sample larger than population")
+    if 2 * k > num_matching:
+        # Rejection sampling would mostly draw duplicates, enumerating the matching entries is cheaper
+        return rng.permutation(np.flatnonzero(flat == value))[:k]
+
+    sample = np.empty(0, dtype=np.int64)
+    while len(sample) < k:
+        batch_size = int(1.1 * (k - len(sample)) * flat.size / num_matching) + 16
+        draws = rng.integers(0, flat.size, size=batch_size)
+        sample = np.concatenate((sample, draws[flat[draws] == value]))
+        # Keep the first occurrence of every index, which preserves the (random) order of the sample
+        _, first_occurrences = np.unique(sample, return_index=True)
+        sample = sample[np.sort(first_occurrences)]
+
+    return sample[:k]
+
+
+class PerturbationBuffer:
+    def __init__(self, baseline):
+        """
+        Scratch copy of the approval matrix `baseline`, which is never modified.
+
+        Perturbations are applied to `approvals` in place, and `reset` restores the baseline by copying back only the
+        touched entries, so neither applying nor reverting a perturbation allocates a new matrix.
+        """
+        self.baseline = baseline
+        self.approvals = baseline.copy()
+        self._flat_baseline = self.baseline.reshape(-1)
+        self._flat_approvals = self.approvals.reshape(-1)
+        self._touched = []
+
+    def apply(self, flat_idxs):
+        """
+        Flip the given entries, which must be distinct.
+
+        Returns the affected voters together with their approval rows before the flip, as needed by
+        `IncrementalSeqThiele.update`.
+        """
+        voters = flat_idxs // self.approvals.shape[1]
+        if len(voters) > 1:  # a single flip (see `stability_radius.stability_radii`) needs no deduplication
+            voters = np.unique(voters)
+        old_rows = self.approvals[voters]
+        self._flat_approvals[flat_idxs] ^= True
+        self._touched.append(flat_idxs)
+
+        return voters, old_rows
+
+    def reset(self):
+        for flat_idxs in self._touched:
+            self._flat_approvals[flat_idxs] = self._flat_baseline[flat_idxs]
+        self._touched.clear()
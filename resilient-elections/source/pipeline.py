@@ -0,0 +1,43 @@
+import queue
+import threading
+
+
+class Stage:
+    def __init__(self, max_size):
+        """
+        Thread which runs the calls put to it one after another, in order, such that the caller can go on, e.g., with
+        handing out elections to the pool while results are stored. At most `max_size` calls are pending, beyond which
+        `put` blocks, which bounds the memory of the arguments waiting.
+
+        An exception of a call is raised by the next `put` or by `close`, and the calls after it are dropped.
+        """
+        self.calls = queue.Queue(max_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            call = self.calls.get()
+            if call is None:
+                return
+            if self.error is None:
+                function, args = call
+                try:
+                    function(*args)
+                except BaseException as error:
+                    self.error = error
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def put(self, function, *args):
+        self._raise_error()
+        self.calls.put((function, args))
+
+    def close(self):
+        # Wait for all pending calls
+        self.calls.put(None)
+        self.thread.join()
+        self._raise_error()
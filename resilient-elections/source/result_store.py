@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+
+from parameters import COMMITTEE_SIZE, NUM_ITERATIONS, RULE_IDS, percentage_changes
+
+# Columnar result store: the results of one parameter set are kept in fixed-shape arrays, one memory-mapped .npy file
+# per quantity, with one slot per election. Any process can write its elections into the files, and a mask marks the
+# elections which are done, such that an interrupted run can be resumed.
+
+OPS = ["ADD", "DEL", "MIX"]
+
+ARRAY_SPECS = {
+    # name: (dtype, shape without the election axis, position of the election axis)
+    "approval_counts": (np.int64, (), 0),
+    "exp1_distances": (np.int8, (len(RULE_IDS), len(OPS), len(percentage_changes), NUM_ITERATIONS), 3),
+    "exp2_num_ties": (np.int32, (len(RULE_IDS), len(percentage_changes), NUM_ITERATIONS), 2),
+    "exp2_distance_gaps": (np.int8, (len(RULE_IDS), len(percentage_changes), NUM_ITERATIONS), 2),
+    "exp3_replacements": (np.int32, (len(RULE_IDS), len(percentage_changes), COMMITTEE_SIZE), 2),
+}
+
+
+def results_to_arrays(results):
+    """Convert the results of one election, as returned by `run_one_election`, into the arrays of the store."""
+    exp2 = np.array([[results[rule]["EXP2"]["MIX"][percentage] for percentage in percentage_changes]
+                     for rule in RULE_IDS]).reshape(len(RULE_IDS), len(percentage_changes), -1, 2)
+
+    return {
+        "approval_counts": np.array(results[RULE_IDS[0]]["EXP1"]["Approval_Counts"][0]),
+        "exp1_distances": np.array([[[results[rule]["EXP1"][op][percentage] for percentage in percentage_changes]
+                                     for op in OPS] for rule in RULE_IDS]),
+        "exp2_num_ties": exp2[..., 0],
+        "exp2_distance_gaps": exp2[..., 1],
+        "exp3_replacements": np.array([[results[rule]["EXP3"]["MIX"][percentage] for percentage in percentage_changes]
+                                       for rule in RULE_IDS]),
+    }
+
+
+class ResultStore:
+    def __init__(self, directory, num_elections):
+        """Open the store in `directory`, creating empty arrays for `num_elections` elections if it does not exist."""
+        self.directory = directory
+        self.num_elections = num_elections
+
+        if not os.path.exists(self._path("completed")):
+            os.makedirs(directory, exist_ok=True)
+            for name, (dtype, shape, axis) in ARRAY_SPECS.items():
+                full_shape = shape[:axis] + (num_elections,) + shape[axis:]
+                np.lib.format.open_memmap(self._path(name), mode="w+", dtype=dtype, shape=full_shape).flush()
+            # Written last, so that its existence marks a fully created store
+            np.lib.format.open_memmap(self._path("completed"), mode="w+", dtype=bool, shape=(num_elections,)).flush()
+
+    def _path(self, name):
+        return f"{self.directory}/{name}.npy"
+
+    def array(self, name):
+        return np.load(self._path(name), mmap_mode="r")
+
+    def completed_elections(self):
+        return set(np.flatnonzero(self.array("completed")).tolist())
+
+    def write_election(self, election_idx, results):
+        for name, values in results_to_arrays(results).items():
+            axis = ARRAY_SPECS[name][2]
+            array = np.load(self._path(name), mmap_mode="r+")
+            array[(slice(None),) * axis + (election_idx,)] = values
+            array.flush()
+
+        # Only mark the election as done once all of its results are on disk
+        completed = np.load(self._path("completed"), mmap_mode="r+")
+        completed[election_idx] = True
+        completed.flush()
+
+    def to_json_schema(self):
+        """Return the results in the nested layout of the JSON files written by `run_experiments.py`."""
+        if len(self.completed_elections()) < self.num_elections:
+            raise ValueError(f"Result store {self.directory} is incomplete")
+
+        approval_counts = self.array("approval_counts").tolist()
+        exp1_distances = self.array("exp1_distances")
+        exp2 = np.stack((self.array("exp2_num_ties"), self.array("exp2_distance_gaps")), axis=-1)
+        exp3_replacements = self.array("exp3_replacements")
+
+        results = {}
+        for rule_idx, rule in enumerate(RULE_IDS):
+            results[rule] = {
+                "EXP1": {"Approval_Counts": approval_counts},
+                "EXP2": {"Approval_Counts": approval_counts, "MIX": {}},
+                "EXP3": {"Approval_Counts": approval_counts, "MIX": {}},
+            }
+            for op_idx, op in enumerate(OPS):
+                results[rule]["EXP1"][op] = {str(percentage): exp1_distances[rule_idx, op_idx, percentage_idx].tolist()
+                                             for percentage_idx, percentage in enumerate(percentage_changes)}
+            for percentage_idx, percentage in enumerate(percentage_changes):
+                results[rule]["EXP2"]["MIX"][str(percentage)] = exp2[rule_idx, percentage_idx].tolist()
+                results[rule]["EXP3"]["MIX"][str(percentage)] = exp3_replacements[rule_idx, percentage_idx].tolist()
+
+        return results
@@ -1,18 +1,42 @@
+import argparse
 import multiprocessing as mp
-import random
+import os
+import queue
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+from itertools import accumulate
 
 import abcvoting
-from abcvoting import abcrules
-from abcvoting.generate import *
+import numpy as np
 from numpy.random import default_rng
 from tqdm import tqdm
 
+from approval_matrix import seq_thiele_resolute_batch, seq_thiele_resolute_lazy, stack_perturbations, \
+    thiele_weights
+from adaptive_sampling import ConvergenceTracker, iterations_converged
+from committee_cache import LRUCache, fingerprint
+from cost_model import CostModel, election_features
+from distributed import Coordinator, run_worker
+from incremental_seqthiele import IncrementalSeqThiele
+from instrumentation import PhaseStats, election_phases, election_stats, profile_worker
 from parameters import *
-from util import write_data
-
-
-# Monkey patch inefficient abcvoting method for own cython version (about 5 to 6x speedup)
+from perturbations import PerturbationBuffer, sample_entries
+from pipeline import Stage
+from result_store import ResultStore
+from samplers import sample_approvals, sample_sparse_approvals
+from sparse_approvals import SparsePerturbationBuffer, sample_sparse_entries
+from stability_radius import stability_radii
+from streaming_stats import merge_summaries, summarize_results, summary_to_json
+from tied_committees import seq_thiele_tie_distance
+from util import check_settings, completed_elections, get_file_stem, get_seed_sequence, get_store_directory, \
+    read_shard, write_data, write_shard
+
+
+# Monkey patch inefficient abcvoting method for own cython version (about 5 to 6x speedup, see benchmark.py)
 from marginal_thiele_scores_cython import marginal_thiele_scores_add_cython
 abcvoting.scores.marginal_thiele_scores_add = marginal_thiele_scores_add_cython
 
@@ -21,17 +45,12 @@ from overwrite_abcvoting_seqthiele import compute_seq_thiele_method_return_order
 abcvoting.abcrules.compute_seq_thiele_method = compute_seq_thiele_method_return_order
 
 
-## HELPER FUNCTIONS ##
-def compute_committee_resolute(rule, profile, return_order=False):
-    if return_order:
-        return abcrules.compute(rule, profile, committeesize=COMMITTEE_SIZE, resolute=True)
-    else:
-        return abcrules.compute(rule, profile, committeesize=COMMITTEE_SIZE, resolute=True)[0]
+# Integer Thiele weight tables for the dense approval-matrix engine, e.g., "seqpav" -> weights of "pav"
+rule_weights = {rule: thiele_weights(rule[len("seq"):], COMMITTEE_SIZE)[0] for rule in RULE_IDS}
+stacked_rule_weights = np.stack([rule_weights[rule] for rule in RULE_IDS])
 
 
-compute_committees_irrresolute = lambda rule, profile: abcrules.compute(rule, profile, committeesize=COMMITTEE_SIZE,
-                                                                        resolute=False,
-                                                                        max_num_of_committees=MAX_NUM_COMMITTEES)
+## HELPER FUNCTIONS ##
 committee_distance = lambda S1, S2: len(S1 - S2)
 
 
@@ -41,6 +60,8 @@ def build_results_dict(accum: bool = False):
         results[rule] = {"EXP1": {}, "EXP2": {}, "EXP3": {}}
 
         results[rule]["EXP1"]["Approval_Counts"] = []
+        if ADAPTIVE_SAMPLING:  # the numbers of iterations of the elections then vary, see adaptive_sampling.py
+            results[rule]["EXP1"]["Num_Iterations"] = []
         for op in ["ADD", "DEL", "MIX"]:
             results[rule]["EXP1"][op] = {}
             for percentage in percentage_changes:
@@ -48,193 +69,589 @@ def build_results_dict(accum: bool = False):
 
         results[rule]["EXP2"]["MIX"] = {}
         results[rule]["EXP2"]["Approval_Counts"] = []
+        if ADAPTIVE_SAMPLING:
+            results[rule]["EXP2"]["Num_Iterations"] = []
         for percentage in percentage_changes:
             results[rule]["EXP2"][op][percentage] = []
 
         results[rule]["EXP3"]["MIX"] = {}
         results[rule]["EXP3"]["Approval_Counts"] = []
+        if ADAPTIVE_SAMPLING:
+            results[rule]["EXP3"]["Num_Iterations"] = []
         for percentage in percentage_changes:
             if accum:
                 results[rule]["EXP3"][op][percentage] = []
             else:
                 results[rule]["EXP3"][op][percentage] = [0] * COMMITTEE_SIZE
 
+        if STABILITY_RADII:  # one list of stability radii per election, see stability_radius.py
+            results[rule]["EXP4"] = {"Approval_Counts": [], "ADD": [], "DEL": [], "MIX": []}
+
     return results
 
 
 def extend_results(accum_results, new_results):
     for rule in RULE_IDS:
         accum_results[rule]["EXP1"]["Approval_Counts"].extend(new_results[rule]["EXP1"]["Approval_Counts"])
+        if ADAPTIVE_SAMPLING:
+            accum_results[rule]["EXP1"]["Num_Iterations"].extend(new_results[rule]["EXP1"]["Num_Iterations"])
         for op in ["ADD", "DEL", "MIX"]:
             for percentage in percentage_changes:
                 accum_results[rule]["EXP1"][op][percentage].append(new_results[rule]["EXP1"][op][percentage])
 
         accum_results[rule]["EXP2"]["Approval_Counts"].extend(new_results[rule]["EXP2"]["Approval_Counts"])
+        if ADAPTIVE_SAMPLING:
+            accum_results[rule]["EXP2"]["Num_Iterations"].extend(new_results[rule]["EXP2"]["Num_Iterations"])
         for percentage in percentage_changes:
             accum_results[rule]["EXP2"]["MIX"][percentage].append(new_results[rule]["EXP2"][op][percentage])
 
         accum_results[rule]["EXP3"]["Approval_Counts"].extend(new_results[rule]["EXP3"]["Approval_Counts"])
+        if ADAPTIVE_SAMPLING:
+            accum_results[rule]["EXP3"]["Num_Iterations"].extend(new_results[rule]["EXP3"]["Num_Iterations"])
         for percentage in percentage_changes:
             accum_results[rule]["EXP3"]["MIX"][percentage].append(new_results[rule]["EXP3"]["MIX"][percentage])
 
-
-def sample_election(params):
-    match params.id:
-        case "1D" | "2D":
-            distribution = PointProbabilityDistribution(params.dist_id)
-            profile = random_euclidean_vcr_profile(NUM_VOTERS, NUM_CANDIDATES, distribution, distribution,
-                                                   params.radius, 0)
-            if params.euclid_resample:
-                resample_euclidian_election(profile, params)
-        case "Res":
-            profile = random_resampling_profile(NUM_VOTERS, NUM_CANDIDATES, params.rho, params.phi)
-        case _:
-            raise ValueError
-
-    return profile
-
-
-def resample_euclidian_election(profile, params):
-    rng = default_rng()
-    for v in profile:
-        v_rho = len(v.approved) / NUM_CANDIDATES
-        for c in profile.candidates:
-            if rng.random() < params.phi:
-                if rng.random() < v_rho:
-                    if c not in v.approved:
-                        v.approved.add(c)
-                elif c in v.approved:
-                    v.approved.remove(c)
-
-
-def run_one_election(params):
-    profile = sample_election(params)
+        if STABILITY_RADII:
+            accum_results[rule]["EXP4"]["Approval_Counts"].extend(new_results[rule]["EXP4"]["Approval_Counts"])
+            for op in ["ADD", "DEL", "MIX"]:
+                accum_results[rule]["EXP4"][op].append(new_results[rule]["EXP4"][op])
+
+
+def evaluate_perturbations(perturbed, engine, original_engine, level_flips, committee_cache):
+    """
+    Yield the approval matrix, the committees of all rules in `RULE_IDS` and the fingerprint (see `committee_cache`)
+    after each perturbation level, where every level applies its flips on top of the previous ones, starting from the
+    original profile. Committees of profiles in `committee_cache` are not recomputed, except by the incremental engine,
+    which has to follow every profile anyway, and hence neither reads nor fills the cache (the fingerprints still key
+    the tie enumeration results).
+    """
+    fingerprints = list(accumulate(level_flips, lambda previous, flips: fingerprint(flips, previous), initial=0))[1:]
+    if SPARSE_PROFILES or BATCHED_EVALUATION:
+        cached_committees = [committee_cache.get(level_fingerprint) for level_fingerprint in fingerprints]
+        election_stats.count("committee_cache_hits", sum(committees is not None for committees in cached_committees))
+        election_stats.count("committee_cache_misses", sum(committees is None for committees in cached_committees))
+
+    if SPARSE_PROFILES:
+        # Sparse profiles are too large to stack, and most voters change, so every level is computed from scratch,
+        # where lazy greedy only recomputes the marginal scores of few of the many candidates
+        with election_stats.phase("perturbations"):
+            perturbed.reset()
+        for flips, level_fingerprint, committees in zip(level_flips, fingerprints, cached_committees):
+            with election_stats.phase("perturbations"):
+                perturbed.apply(flips)
+            if committees is None:
+                with election_stats.phase("resolute"):
+                    committees = [seq_thiele_resolute_lazy(weights, perturbed.approvals, COMMITTEE_SIZE)
+                                  for weights in stacked_rule_weights]
+                election_stats.count("seq_thiele_calls", len(RULE_IDS))
+                committee_cache.put(level_fingerprint, committees)
+            yield perturbed.approvals, committees, level_fingerprint
+    elif BATCHED_EVALUATION:
+        with election_stats.phase("perturbations"):
+            cumulative_flips = list(accumulate(level_flips,
+                                               lambda flips, more_flips: np.concatenate((flips, more_flips))))
+            stack = stack_perturbations(perturbed.baseline, cumulative_flips)
+        uncached = [level_idx for level_idx, committees in enumerate(cached_committees) if committees is None]
+        if uncached:
+            with election_stats.phase("resolute"):
+                committees = seq_thiele_resolute_batch(stacked_rule_weights, stack[uncached], COMMITTEE_SIZE)
+            election_stats.count("seq_thiele_calls", len(RULE_IDS) * len(uncached))
+            for batch_idx, level_idx in enumerate(uncached):
+                cached_committees[level_idx] = committees[:, batch_idx].tolist()
+                committee_cache.put(fingerprints[level_idx], cached_committees[level_idx])
+        yield from zip(stack, cached_committees, fingerprints)
+    else:
+        # Revert profile to original state
+        with election_stats.phase("perturbations"):
+            perturbed.reset()
+            engine.restore(original_engine)
+
+        for flips, level_fingerprint in zip(level_flips, fingerprints):
+            with election_stats.phase("perturbations"):
+                changes = perturbed.apply(flips)
+            with election_stats.phase("resolute"):
+                engine.update(*changes)
+            election_stats.count("seq_thiele_calls", len(RULE_IDS))
+            # The engine's committees change with the next level
+            yield perturbed.approvals, [list(committee) for committee in engine.committees], level_fingerprint
+
+
+def sample_baseline(params, seed_sequence):
+    # The first random stream of an election samples its profile, see `run_one_election`
+    return sample_approvals(params, default_rng(seed_sequence.spawn(1)[0]), NUM_VOTERS, NUM_CANDIDATES)
+
+
+def run_one_election(params, seed_sequence, baseline=None):
+    """
+    Run all experiments on one election, whose profile is sampled unless it is given as `baseline`, which then has to
+    be the profile `sample_baseline` returns for the same seed sequence.
+    """
+    # Independent random streams for sampling the profile and for each iteration, see `util.get_seed_sequence`
+    sampling_seed_sequence, *iteration_seed_sequences = seed_sequence.spawn(1 + NUM_ITERATIONS)
+
+    if SPARSE_PROFILES:
+        if baseline is None:
+            with election_stats.phase("sampling"):
+                baseline = sample_sparse_approvals(params, default_rng(sampling_seed_sequence), NUM_VOTERS,
+                                                   NUM_CANDIDATES)
+        perturbed = SparsePerturbationBuffer(baseline)
+        sample = sample_sparse_entries
+        num_approvals = baseline.nnz
+
+        engine = original_engine = None
+        with election_stats.phase("resolute"):
+            original_candidate_orders = [seq_thiele_resolute_lazy(weights, baseline, COMMITTEE_SIZE)
+                                         for weights in stacked_rule_weights]
+    else:
+        if baseline is None:
+            with election_stats.phase("sampling"):
+                baseline = sample_approvals(params, default_rng(sampling_seed_sequence), NUM_VOTERS, NUM_CANDIDATES)
+        # Perturbations only ever touch the private scratch copy, so `baseline` may be a read-only memory map
+        perturbed = PerturbationBuffer(baseline)
+        sample = sample_entries
+        num_approvals = int(np.count_nonzero(perturbed.baseline))
+
+        with election_stats.phase("resolute"):
+            if BATCHED_EVALUATION and not STABILITY_RADII:
+                engine = original_engine = None
+                original_candidate_orders = seq_thiele_resolute_batch(stacked_rule_weights, baseline[np.newaxis],
+                                                                      COMMITTEE_SIZE)[:, 0].tolist()
+            else:
+                # One incremental seqThiele engine for all rules follows the perturbations applied to
+                # `perturbed.approvals` (of the levels unless they are batched, and of the stability radii), the copy
+                # keeps the original state
+                engine = IncrementalSeqThiele(stacked_rule_weights, perturbed.approvals, COMMITTEE_SIZE)
+                original_engine = engine.copy()
+                original_candidate_orders = original_engine.committees
+    election_stats.count("seq_thiele_calls", len(RULE_IDS))
 
     results = build_results_dict()
 
-    sample_space_add = [(v_idx, c) for v_idx, v in enumerate(profile) for c in (set(profile.candidates) - v.approved)]
-    sample_space_del = [(v_idx, c) for v_idx, v in enumerate(profile) for c in v.approved]
+    # Committees of all rules and tie enumeration results of each rule per profile fingerprint, where the baseline
+    # (fingerprint 0) recurs at the lowest level of every operation in every iteration
+    committee_cache = LRUCache(COMMITTEE_CACHE_SIZE)
+    committee_cache.put(0, [list(candidate_order) for candidate_order in original_candidate_orders])
+    tie_cache = LRUCache(COMMITTEE_CACHE_SIZE)
 
     original_committees = {}
-    for rule in RULE_IDS:
-        original_committees[rule] = compute_committee_resolute(rule, profile, True)
-
-        results[rule]["EXP1"]["Approval_Counts"].append(len(sample_space_del))
-        results[rule]["EXP2"]["Approval_Counts"].append(len(sample_space_del))
-        results[rule]["EXP3"]["Approval_Counts"].append(len(sample_space_del))
-
-    for _ in range(NUM_ITERATIONS):
+    for rule_idx, rule in enumerate(RULE_IDS):
+        candidate_order = list(original_candidate_orders[rule_idx])
+        original_committees[rule] = set(candidate_order), candidate_order
+
+        results[rule]["EXP1"]["Approval_Counts"].append(num_approvals)
+        results[rule]["EXP2"]["Approval_Counts"].append(num_approvals)
+        results[rule]["EXP3"]["Approval_Counts"].append(num_approvals)
+        if STABILITY_RADII:
+            results[rule]["EXP4"]["Approval_Counts"].append(num_approvals)
+
+    for num_iterations, iteration_seed_sequence in enumerate(iteration_seed_sequences, start=1):
+        rng = default_rng(iteration_seed_sequence)
         highest_percentage = percentage_changes[-1]
-        max_numeric_change = int(len(sample_space_del) * highest_percentage)
+        max_numeric_change = int(num_approvals * highest_percentage)
 
-        to_add = random.sample(sample_space_add, k=max_numeric_change)
-        to_del = random.sample(sample_space_del, k=max_numeric_change)
+        # Flat indices of (voter, candidate) pairs, see `perturbations`
+        with election_stats.phase("sample_spaces"):
+            to_add = sample(rng, perturbed.baseline, False, max_numeric_change)
+            to_del = sample(rng, perturbed.baseline, True, max_numeric_change)
 
         mult_factor = 1 / highest_percentage
         split_indices = [int(mult_factor * percentage * max_numeric_change) for percentage in [0] + percentage_changes]
 
         to_add_split = [to_add[i:j] for i, j in zip(split_indices, split_indices[1:])]
         to_del_split = [to_del[i:j] for i, j in zip(split_indices, split_indices[1:])]
-        to_mix_split = [(to_add_sub[:len(to_add_sub) // 2], to_del_sub[:len(to_del_sub) // 2]) for
+        to_mix_split = [np.concatenate((to_add_sub[:len(to_add_sub) // 2], to_del_sub[:len(to_del_sub) // 2])) for
                         to_add_sub, to_del_sub in zip(to_add_split, to_del_split)]
 
         # Collect data for ADD operation
-        for percentage, sub_to_add in zip(percentage_changes, to_add_split):
-            # Apply changes to profile
-            for voter_idx, candidate_idx in sub_to_add:
-                profile[voter_idx].approved.add(candidate_idx)
-
+        add_evaluations = evaluate_perturbations(perturbed, engine, original_engine, to_add_split, committee_cache)
+        for percentage, (_, committees, _) in zip(percentage_changes, add_evaluations):
             # Collect data for EXP1
-            for rule in RULE_IDS:
+            for rule_idx, rule in enumerate(RULE_IDS):
                 committee_ori = original_committees[rule][0]
-                committee_add = compute_committee_resolute(rule, profile)
+                committee_add = set(committees[rule_idx])
                 dist_add = committee_distance(committee_ori, committee_add)
                 results[rule]["EXP1"]["ADD"][percentage].append(dist_add)
 
-        # Revert profile to original state
-        for sub_to_add in to_add_split:
-            for voter_idx, candidate_idx in sub_to_add:
-                profile[voter_idx].approved.remove(candidate_idx)
-
         # Collect data for REMOVE operation
-        for percentage, sub_to_del in zip(percentage_changes, to_del_split):
-            # Apply changes to profile
-            for voter_idx, candidate_idx in sub_to_del:
-                profile[voter_idx].approved.remove(candidate_idx)
-
+        del_evaluations = evaluate_perturbations(perturbed, engine, original_engine, to_del_split, committee_cache)
+        for percentage, (_, committees, _) in zip(percentage_changes, del_evaluations):
             # Collect data for EXP1
-            for rule in RULE_IDS:
+            for rule_idx, rule in enumerate(RULE_IDS):
                 committee_ori = original_committees[rule][0]
-                committee_del = compute_committee_resolute(rule, profile)
+                committee_del = set(committees[rule_idx])
                 dist_del = committee_distance(committee_ori, committee_del)
                 results[rule]["EXP1"]["DEL"][percentage].append(dist_del)
 
-        # Revert profile to original state
-        for sub_to_del in to_del_split:
-            for voter_idx, candidate_idx in sub_to_del:
-                profile[voter_idx].approved.add(candidate_idx)
-
         # Collect data for MIX operation
-        for percentage, (sub_to_add, sub_to_del) in zip(percentage_changes, to_mix_split):
-            # Apply changes to profile
-            for voter_idx, candidate_idx in sub_to_add:
-                profile[voter_idx].approved.add(candidate_idx)
-            for voter_idx, candidate_idx in sub_to_del:
-                profile[voter_idx].approved.remove(candidate_idx)
-
-            for rule in RULE_IDS:
+        mix_evaluations = evaluate_perturbations(perturbed, engine, original_engine, to_mix_split, committee_cache)
+        for percentage, (approvals_mix, committees, mix_fingerprint) in zip(percentage_changes, mix_evaluations):
+            for rule_idx, rule in enumerate(RULE_IDS):
                 committee_ori, candidate_order = original_committees[rule]
-                committee_mix = compute_committee_resolute(rule, profile)
+                committee_mix = set(committees[rule_idx])
 
                 # Collect data for EXP1
                 dist_mix = committee_distance(committee_ori, committee_mix)
                 results[rule]["EXP1"]["MIX"][percentage].append(dist_mix)
 
                 # Collect data for EXP2
-                tied_committees_mix = compute_committees_irrresolute(rule, profile)
-                dist_mix_min = min(
-                    committee_distance(committee_ori, tied_committee) for tied_committee in tied_committees_mix)
-                results[rule]["EXP2"]["MIX"][percentage].append((len(tied_committees_mix), dist_mix - dist_mix_min))
+                tie_distance = tie_cache.get((mix_fingerprint, rule))
+                election_stats.count("tie_cache_hits" if tie_distance is not None else "tie_cache_misses")
+                if tie_distance is None:
+                    with election_stats.phase("ties"):
+                        tie_distance = seq_thiele_tie_distance(rule_weights[rule], approvals_mix, COMMITTEE_SIZE,
+                                                               committee_ori, MAX_NUM_COMMITTEES,
+                                                               prune=not EXP2_EXACT_TIE_COUNTS)
+                    election_stats.count("tie_enumerations")
+                    election_stats.count("tied_committees", tie_distance[0])
+                    tie_cache.put((mix_fingerprint, rule), tie_distance)
+                num_tied_committees, dist_mix_min = tie_distance
+                results[rule]["EXP2"]["MIX"][percentage].append((num_tied_committees, dist_mix - dist_mix_min))
 
                 # Collect data for EXP3
                 for i, c in enumerate(candidate_order):
                     if c not in committee_mix:
                         results[rule]["EXP3"]["MIX"][percentage][i] += 1
 
-        # Revert profile to original state
-        for sub_to_add, sub_to_del in to_mix_split:
-            for voter_idx, candidate_idx in sub_to_add:
-                profile[voter_idx].approved.remove(candidate_idx)
-            for voter_idx, candidate_idx in sub_to_del:
-                profile[voter_idx].approved.add(candidate_idx)
+        # Collect data for EXP4, where the ADD and DEL orders are those of EXP1, and MIX alternates between added and
+        # removed approvals
+        if STABILITY_RADII:
+            with election_stats.phase("stability_radii"):
+                orders = {"ADD": to_add, "DEL": to_del,
+                          "MIX": np.column_stack((to_add, to_del)).reshape(-1)[:max_numeric_change]}
+                for op, order in orders.items():
+                    perturbed.reset()
+                    engine.restore(original_engine)
+                    for rule, radius in zip(RULE_IDS, stability_radii(perturbed, engine, order)):
+                        results[rule]["EXP4"][op].append(radius)
+                    election_stats.count("stability_radius_searches", len(RULE_IDS))
+
+        if ADAPTIVE_SAMPLING and iterations_converged(results, num_iterations):
+            break
+
+    if ADAPTIVE_SAMPLING:
+        for rule in RULE_IDS:
+            for exp in ["EXP1", "EXP2", "EXP3"]:
+                results[rule][exp]["Num_Iterations"].append(num_iterations)
 
     return results
 
 
-if __name__ == '__main__':
-
-    start_time = datetime.now()
+def summarize_election(results):
+    accum_results = build_results_dict(True)
+    extend_results(accum_results, results)
+    return summarize_results(accum_results)
+
+
+def run_election_task(task):
+    params, election_idx, shared_profile = task
+
+    # Attach to the profile sampled by the main process without copying it, see `run_tasks`
+    baseline = None
+    if shared_profile is not None:
+        filepath, offset = shared_profile
+        baseline = np.load(filepath, mmap_mode="r")[offset]
+
+    start = time.perf_counter()
+    with election_phases():
+        results = run_one_election(params, get_seed_sequence(params, election_idx), baseline)
+        cost = (time.perf_counter() - start, *election_features(results))
+
+        # Only ship the summary of the election back to the main process, whose size does not depend on NUM_ITERATIONS
+        if RESULT_STORE == "summary":
+            results = summarize_election(results)
+
+    phase_stats = PhaseStats(election_stats.timers, election_stats.counters) if PROFILE_PHASES else None
+    return params, election_idx, results, phase_stats, cost
+
+
+def run_profiled_election_task(task):
+    return profile_worker(run_election_task, task)
+
+
+def write_shared_profiles(filepath, tasks):
+    profiles = np.lib.format.open_memmap(filepath, mode="w+", dtype=bool,
+                                         shape=(len(tasks), NUM_VOTERS, NUM_CANDIDATES))
+    for offset, (params, election_idx) in enumerate(tasks):
+        profiles[offset] = sample_baseline(params, get_seed_sequence(params, election_idx))
+    profiles.flush()
+
+
+def run_tasks(pool, tasks, cost_model, stopped=lambda params: False):
+    """
+    Run the elections `tasks` on `pool` (or in this process if it is None), and yield their results in any order.
+
+    Elections of parameter sets for which `stopped` becomes true (see adaptive_sampling.py) are not started anymore,
+    instead (params, election_idx, None, None, None) is yielded for each of them.
+
+    Tasks start in order of decreasing time predicted by `cost_model`, such that cheap elections fill up idle cores at
+    the end. As the caller refits the model to the results yielded so far, the order of the tasks not yet started is
+    updated: only two tasks per process are handed to the pool at any time.
+
+    With SHARED_PROFILES, the profiles of every PROFILE_BATCH_SIZE elections, in the order in which they are started,
+    are sampled into one memory-mapped file, which the workers only read from. A batch is formed and sampled by a
+    thread when an election without a sampled profile is started, from it and the next pending elections, and the
+    next batch right after the first of its elections is started, such that it is usually ready before it is needed.
+    Its file is deleted once all of its elections are done.
+    """
+    if SHARED_PROFILES and SPARSE_PROFILES:
+        raise ValueError("Sparse profiles cannot be shared")
+    if not SHARED_PROFILES:
+        yield from run_ordered(pool, tasks, cost_model, stopped)
+        return
+
+    # Task key (see `distributed.get_task_key`) -> (batch index, offset in the batch), for the sampled batches
+    positions = {}
+    num_started, num_left = [], []  # elections per sampled batch started and not done yet
+
+    with tempfile.TemporaryDirectory() as directory, ThreadPoolExecutor(max_workers=1) as sampler:
+        sampled = []  # futures of the batches sampled so far, in order
+
+        def sample_batch(pending):
+            batch = [(params, election_idx) for params, election_idx in pending
+                     if (get_file_stem(params), election_idx) not in positions][:PROFILE_BATCH_SIZE]
+            if not batch:
+                return
+            for offset, (params, election_idx) in enumerate(batch):
+                positions[get_file_stem(params), election_idx] = (len(sampled), offset)
+            num_started.append(0)
+            num_left.append(len(batch))
+            sampled.append(sampler.submit(write_shared_profiles, f"{directory}/{len(sampled)}.npy", batch))
+
+        def get_shared_profile(params, election_idx, pending):
+            if (get_file_stem(params), election_idx) not in positions:
+                sample_batch([(params, election_idx)] + pending)
+            batch_idx, offset = positions[get_file_stem(params), election_idx]
+            num_started[batch_idx] += 1
+            # Once the newest batch is in use, the next one is sampled ahead
+            if batch_idx == len(sampled) - 1 and num_started[batch_idx] == 1:
+                sample_batch(pending)
+            sampled[batch_idx].result()
+            return f"{directory}/{batch_idx}.npy", offset
+
+        for result in run_ordered(pool, tasks, cost_model, stopped, get_shared_profile):
+            yield result
+            # Elections which were skipped before they were started may not have been sampled
+            if (get_file_stem(result[0]), result[1]) not in positions:
+                continue
+            batch_idx, _ = positions[get_file_stem(result[0]), result[1]]
+            num_left[batch_idx] -= 1
+            if num_left[batch_idx] == 0:
+                sampled[batch_idx].result()
+                os.remove(f"{directory}/{batch_idx}.npy")
+
+
+def drop_stopped(pending, stopped):
+    # Split off the tasks of stopped parameter sets, see `run_tasks`
+    skipped = [(params, election_idx, None, None, None) for params, election_idx in pending if stopped(params)]
+    return [task for task in pending if not stopped(task[0])], skipped
+
+
+def run_ordered(pool, tasks, cost_model, stopped, get_shared_profile=lambda params, election_idx, pending: None):
+    # Whenever a task finishes, start the pending one with the highest predicted time, see `run_tasks`. The profile of
+    # a started task is looked up given the tasks still pending, in order
+    pending = list(tasks)
+    if pool is None:
+        while True:
+            pending, skipped = drop_stopped(pending, stopped)
+            yield from skipped
+            if not pending:
+                return
+            pending = cost_model.order(pending)
+            params, election_idx = pending.pop(0)
+            yield run_profiled_election_task((params, election_idx,
+                                              get_shared_profile(params, election_idx, pending)))
+
+    completed = queue.Queue()
+    num_running = 0
+    while True:
+        pending, skipped = drop_stopped(pending, stopped)
+        yield from skipped
+        pending = cost_model.order(pending)
+        while pending and num_running < 2 * mp.cpu_count():
+            params, election_idx = pending.pop(0)
+            pool.apply_async(run_profiled_election_task,
+                             ((params, election_idx, get_shared_profile(params, election_idx, pending)),),
+                             callback=completed.put, error_callback=completed.put)
+            num_running += 1
+        if num_running == 0:
+            return
+
+        result = completed.get()
+        num_running -= 1
+        if isinstance(result, BaseException):
+            raise result
+        yield result
+
+
+# Shards of summaries are kept apart from shards of full results, which have a different layout
+result_shards_path = summaries_directory_path if RESULT_STORE == "summary" else shards_directory_path
+
+
+def get_result_store(params):
+    return ResultStore(get_store_directory(arrays_directory_path, params), NUM_ELECTIONS)
+
+
+def store_election(params, election_idx, new_results, results_by_election):
+    if WRITE_DATA and RESULT_STORE == "npy":
+        get_result_store(params).write_election(election_idx, new_results)
+    elif WRITE_DATA:
+        write_shard(result_shards_path, params, election_idx, new_results)
+    else:
+        results_by_election[election_idx] = new_results
 
-    for i, params in enumerate(parameter_list):
-        accum_results = build_results_dict(True)
 
-        if MULTIPROCESSING:
-            with mp.Pool(processes=mp.cpu_count()) as p:
-                for new_results in tqdm(p.imap_unordered(run_one_election, [params] * NUM_ELECTIONS),
-                                        total=NUM_ELECTIONS):
-                    extend_results(accum_results, new_results)
-        else:
-            for _ in tqdm(range(NUM_ELECTIONS)):
-                new_results = run_one_election(params)
-                extend_results(accum_results, new_results)
+def finish_parameter_set(params, results_by_election):
+    if WRITE_DATA and RESULT_STORE == "npy":
+        return  # the result store already holds all elections
 
+    # Merge in order of the elections, such that the output does not depend on the order in which they finished
+    accum_results = None if RESULT_STORE == "summary" else build_results_dict(True)
+    # All elections, unless adaptive sampling stopped early
+    election_idxs = completed_elections(result_shards_path, params) if WRITE_DATA else results_by_election.keys()
+    for election_idx in sorted(election_idxs):
         if WRITE_DATA:
-            write_data(jsons_directory_path, params, accum_results)
+            new_results = read_shard(result_shards_path, params, election_idx)
+        else:
+            new_results = results_by_election[election_idx]
 
-        progress_percent = round(100 * (i + 1) / len(parameter_list), 2)
-        print(f"{i + 1} out of {len(parameter_list)} parameter combinations done ({progress_percent}%).")
-        time_taken = datetime.now() - start_time
-        time_taken = timedelta(seconds=time_taken.seconds)
-        estimate_remaining = (time_taken / (i + 1)) * (len(parameter_list) - (i + 1))
+        if RESULT_STORE != "summary":
+            extend_results(accum_results, new_results)
+        elif accum_results is None:
+            accum_results = new_results
+        else:
+            merge_summaries(accum_results, new_results)
+
+    if WRITE_DATA and RESULT_STORE == "summary":
+        write_data(summaries_directory_path, params, summary_to_json(accum_results))
+    elif WRITE_DATA:
+        write_data(jsons_directory_path, params, accum_results)
+
+
+def estimate_remaining_time(cost_model, remaining_elections, num_processes=None):
+    """
+    Wall time the remaining elections take as predicted by `cost_model` if all `num_processes` (by default those of
+    this host) stay busy, or None before any election has been timed.
+    """
+    remaining_tasks = [(params, election_idx) for params in parameter_list
+                       for election_idx in remaining_elections[get_file_stem(params)]]
+    remaining_seconds = cost_model.remaining_seconds(remaining_tasks)
+    if remaining_seconds is None:
+        return None
+    if num_processes is None:
+        num_processes = mp.cpu_count() if MULTIPROCESSING else 1
+    return timedelta(seconds=round(remaining_seconds / max(num_processes, 1)))
+
+
+def report_progress(num_done, start_time, estimate_remaining=None, params=None, phase_stats=None):
+    progress_percent = round(100 * num_done / len(parameter_list), 2)
+    tqdm.write(f"{num_done} out of {len(parameter_list)} parameter combinations done ({progress_percent}%).")
+    time_taken = datetime.now() - start_time
+    time_taken = timedelta(seconds=time_taken.seconds)
+    if estimate_remaining is None:
+        estimate_remaining = (time_taken / num_done) * (len(parameter_list) - num_done)
         estimate_remaining = timedelta(seconds=estimate_remaining.seconds)
-        print(f"{time_taken} / ~{time_taken + estimate_remaining} (approx. {estimate_remaining} remaining).")
+    tqdm.write(f"{time_taken} / ~{time_taken + estimate_remaining} (approx. {estimate_remaining} remaining).")
+    if PROFILE_PHASES and phase_stats is not None:
+        tqdm.write(f"Phases of the elections of {get_file_stem(params)} in this run:\n{phase_stats.format()}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Run the experiments on this host, or on several (see distributed.py)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--coordinator", action="store_true",
+                      help=f"lease the elections to workers connecting to {COORDINATOR_HOST or 'any interface'}:"
+                           f"{COORDINATOR_PORT}, and store their results")
+    mode.add_argument("--worker", metavar="HOST", help="run the elections leased by the coordinator on HOST")
+    args = parser.parse_args()
+    if args.worker is not None:
+        run_worker(args.worker, run_profiled_election_task)
+        sys.exit()
+
+    start_time = datetime.now()
+
+    # Elections stored by an interrupted run are not run again, unless it had different settings
+    if WRITE_DATA:
+        check_settings(arrays_directory_path if RESULT_STORE == "npy" else result_shards_path)
+    remaining_elections = {}
+    for params in parameter_list:
+        if not WRITE_DATA:
+            done = set()
+        elif RESULT_STORE == "npy":
+            done = get_result_store(params).completed_elections()
+        else:
+            done = completed_elections(result_shards_path, params)
+        remaining_elections[get_file_stem(params)] = set(range(NUM_ELECTIONS)) - done
+
+    if STABILITY_RADII and WRITE_DATA and RESULT_STORE == "npy":
+        raise ValueError("The npy result store has no stability radii, use the json or summary result store")
+    if STABILITY_RADII and SPARSE_PROFILES:
+        raise ValueError("Stability radii are found by the incremental seqThiele engine, which needs dense profiles")
+
+    # With adaptive sampling, no more elections of a parameter set are started once its estimates are precise enough,
+    # which may already be the case for the elections of an interrupted run
+    convergence_trackers = {get_file_stem(params): ConvergenceTracker() for params in parameter_list}
+    if ADAPTIVE_SAMPLING:
+        if WRITE_DATA and RESULT_STORE == "npy":
+            raise ValueError("Adaptive sampling needs results of varying size, use the json or summary result store")
+        for params in parameter_list:
+            for election_idx in sorted(set(range(NUM_ELECTIONS)) - remaining_elections[get_file_stem(params)]):
+                new_results = read_shard(result_shards_path, params, election_idx)
+                convergence_trackers[get_file_stem(params)].add(
+                    new_results if RESULT_STORE == "summary" else summarize_election(new_results))
+            if convergence_trackers[get_file_stem(params)].converged:
+                remaining_elections[get_file_stem(params)] = set()
+    stopped = lambda params: convergence_trackers[get_file_stem(params)].converged
+    num_remaining = sum(map(len, remaining_elections.values()))
+
+    # All elections of all parameter sets go to one pool, instead of waiting for the slowest election of each parameter
+    # set in turn. They are started in order of their time predicted by the cost model, see `run_tasks`
+    tasks = [(params, election_idx) for params in parameter_list
+             for election_idx in sorted(remaining_elections[get_file_stem(params)])]
+    cost_model = CostModel()
+    results_by_election = {get_file_stem(params): {} for params in parameter_list}
+    phase_stats = {get_file_stem(params): PhaseStats() for params in parameter_list}  # of the elections of this run
+    num_params_done = 0
+
+    # Parameter sets which were completed entirely by an interrupted run only need to be merged
+    for params in parameter_list:
+        if not remaining_elections[get_file_stem(params)]:
+            finish_parameter_set(params, results_by_election.pop(get_file_stem(params)))
+            num_params_done += 1
+            report_progress(num_params_done, start_time)
+
+    # As coordinator, the elections run on the workers instead of a pool of this host
+    coordinator = Coordinator(tasks, cost_model, stopped) if args.coordinator else None
+    # Results are stored and parameter sets merged by a thread, while this one keeps handing out elections
+    aggregator = Stage(RESULT_QUEUE_SIZE)
+    with mp.Pool(processes=mp.cpu_count()) if MULTIPROCESSING and coordinator is None else nullcontext() as p:
+        completed = coordinator.run() if coordinator is not None else run_tasks(p, tasks, cost_model, stopped)
+        progress_bar = tqdm(completed, total=len(parameter_list) * NUM_ELECTIONS,
+                            initial=len(parameter_list) * NUM_ELECTIONS - num_remaining)
+        for params, election_idx, new_results, new_phase_stats, cost in progress_bar:
+            # `new_results` is None for skipped elections, see `run_tasks`
+            if new_results is not None:
+                aggregator.put(store_election, params, election_idx, new_results,
+                               results_by_election[get_file_stem(params)])
+                # Workers of a distributed run may not time their elections, see `util.SHARED_SETTINGS`
+                if PROFILE_PHASES and new_phase_stats is not None:
+                    phase_stats[get_file_stem(params)].merge(new_phase_stats)
+                if ADAPTIVE_SAMPLING:
+                    convergence_trackers[get_file_stem(params)].add(
+                        new_results if RESULT_STORE == "summary" else summarize_election(new_results))
+                cost_model.add(params, *cost)
+
+            remaining_elections[get_file_stem(params)].remove(election_idx)
+            estimate_remaining = estimate_remaining_time(
+                cost_model, remaining_elections, coordinator.total_processes() if coordinator is not None else None)
+            progress_bar.set_postfix_str(f"predicted {estimate_remaining} remaining")
+            if not remaining_elections[get_file_stem(params)]:
+                aggregator.put(finish_parameter_set, params, results_by_election.pop(get_file_stem(params)))
+                num_params_done += 1
+                aggregator.put(report_progress, num_params_done, start_time, estimate_remaining, params,
+                               phase_stats.pop(get_file_stem(params)))
+        aggregator.close()
+
+    if coordinator is not None:
+        tqdm.write(f"Dropped {coordinator.num_duplicates} duplicate results of elections leased more than once.")
+        coordinator.close()
@@ -0,0 +1,100 @@
+import numpy as np
+
+from approval_matrix import matrix_to_profile
+from sparse_approvals import SparseApprovals
+
+MAX_CHUNK_ENTRIES = 2 ** 24  # Number of (voter, candidate) pairs sampled at once by `sample_sparse_approvals`
+
+
+# Vectorized samplers for the preference models in `parameters`, which produce approval matrices (see
+# `approval_matrix`) directly. They sample from the same distributions as abcvoting's `random_euclidean_vcr_profile`
+# and `random_resampling_profile`, but draw all random numbers at once instead of per voter and candidate.
+
+def random_points(rng, num_points, dist_id):
+    match dist_id:
+        case "1d_interval":
+            return rng.random((num_points, 1))
+        case "2d_square":
+            return rng.random((num_points, 2))
+        case _:
+            raise ValueError(f"Unsupported point distribution {dist_id}")
+
+
+def approvals_within_radius(voter_points, candidate_points, radius):
+    # Candidates have radius 0, i.e., a voter approves all candidates within their radius
+    distances = np.linalg.norm(voter_points[:, np.newaxis, :] - candidate_points[np.newaxis, :, :], axis=2)
+
+    return distances <= radius
+
+
+def euclidean_vcr_approvals(rng, num_voters, num_cand, dist_id, radius):
+    voter_points = random_points(rng, num_voters, dist_id)
+    candidate_points = random_points(rng, num_cand, dist_id)
+
+    return approvals_within_radius(voter_points, candidate_points, radius)
+
+
+def resampling_approvals(rng, num_voters, num_cand, rho, phi):
+    # The central ballot approves the first floor(rho * num_cand) candidates
+    central_vote = np.arange(num_cand) < int(rho * num_cand)
+    resample = rng.random((num_voters, num_cand)) < phi
+
+    return np.where(resample, rng.random((num_voters, num_cand)) < rho, central_vote)
+
+
+def resample_approvals(rng, approvals, phi):
+    """
+    Resample every approval with probability `phi`, such that the voter then approves the candidate with probability
+    equal to the voter's original share of approved candidates.
+    """
+    voter_rho = approvals.mean(axis=1, keepdims=True)
+    resample = rng.random(approvals.shape) < phi
+
+    return np.where(resample, rng.random(approvals.shape) < voter_rho, approvals)
+
+
+def sample_approvals(params, rng, num_voters, num_cand):
+    match params.id:
+        case "1D" | "2D":
+            approvals = euclidean_vcr_approvals(rng, num_voters, num_cand, params.dist_id, params.radius)
+            if params.euclid_resample:
+                approvals = resample_approvals(rng, approvals, params.phi)
+        case "Res":
+            approvals = resampling_approvals(rng, num_voters, num_cand, params.rho, params.phi)
+        case _:
+            raise ValueError
+
+    return approvals
+
+
+def sample_sparse_approvals(params, rng, num_voters, num_cand):
+    """
+    Sample from the same distribution as `sample_approvals`, but return SparseApprovals (see `sparse_approvals`).
+
+    Voters are sampled independently given the candidates, so the profile is sampled in chunks of voters, each of which
+    is dense only while it is sampled. The random streams differ from `sample_approvals`.
+    """
+    match params.id:
+        case "1D" | "2D":
+            candidate_points = random_points(rng, num_cand, params.dist_id)
+
+            def sample_chunk(num_chunk_voters):
+                approvals = approvals_within_radius(random_points(rng, num_chunk_voters, params.dist_id),
+                                                    candidate_points, params.radius)
+                if params.euclid_resample:
+                    approvals = resample_approvals(rng, approvals, params.phi)
+                return approvals
+        case "Res":
+            def sample_chunk(num_chunk_voters):
+                return resampling_approvals(rng, num_chunk_voters, num_cand, params.rho, params.phi)
+        case _:
+            raise ValueError
+
+    chunk_size = max(MAX_CHUNK_ENTRIES // num_cand, 1)
+    return SparseApprovals.vstack([SparseApprovals.from_dense(sample_chunk(min(chunk_size, num_voters - start)))
+                                   for start in range(0, num_voters, chunk_size)])
+
+
+def sample_profile(params, rng, num_voters, num_cand):
+    # Adapter for code that needs an abcvoting.preferences.Profile
+    return matrix_to_profile(sample_approvals(params, rng, num_voters, num_cand))
@@ -1,6 +1,14 @@
+import sys
+
+import numpy as np
 from Cython.Build import cythonize
-from setuptools import setup
+from setuptools import Extension, setup
+
+# The marginal score kernel runs threads via OpenMP, which Apple's clang does not ship; it then runs single-threaded
+openmp_flags = [] if sys.platform == "darwin" else ["-fopenmp"]
 
 setup(
-    ext_modules=cythonize("marginal_thiele_scores_cython.pyx")
+    ext_modules=cythonize(Extension("marginal_thiele_scores_cython", ["marginal_thiele_scores_cython.pyx"],
+                                    include_dirs=[np.get_include()], extra_compile_args=["-O3"] + openmp_flags,
+                                    extra_link_args=openmp_flags))
 )
@@ -0,0 +1,191 @@
+import numpy as np
+
+
+# Sparse approval profiles for large electorates, where a dense (num_voters x num_cand) matrix does not fit in memory.
+# `SparseApprovals` stores the voters approving each candidate (compressed sparse columns) and supports exactly those
+# operations of dense approval matrices which the seqThiele kernels in `approval_matrix` and `tied_committees` use, so
+# these run on either representation unchanged. Entries are addressed by the same flat indices as in `perturbations`.
+
+MAX_BLOCK_ENTRIES = 2 ** 22  # Number of entries gathered at once when computing marginal scores
+
+
+class SparseApprovals:
+    # Makes numpy defer `weights @ approvals` to `__rmatmul__` instead of converting `approvals` to an array
+    __array_ufunc__ = None
+
+    def __init__(self, indptr, indices, num_voters):
+        """The voters approving candidate c are indices[indptr[c]:indptr[c + 1]], in increasing order."""
+        self.indptr = indptr
+        self.indices = indices
+        self.shape = (num_voters, len(indptr) - 1)
+
+    @classmethod
+    def from_dense(cls, approvals):
+        cands, voters = np.nonzero(approvals.T)
+        indptr = np.zeros(approvals.shape[1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cands, minlength=approvals.shape[1]), out=indptr[1:])
+        return cls(indptr, voters.astype(np.int32), approvals.shape[0])
+
+    @classmethod
+    def vstack(cls, blocks):
+        """Stack profiles of disjoint groups of voters over the same candidates, like `np.vstack`."""
+        counts = np.array([np.diff(block.indptr) for block in blocks])
+        indptr = np.zeros(counts.shape[1] + 1, dtype=np.int64)
+        np.cumsum(counts.sum(axis=0), out=indptr[1:])
+
+        # Within every column, the entries of a block go after those of all previous blocks
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        block_starts = indptr[:-1] + np.cumsum(counts, axis=0) - counts
+        voter_offset = 0
+        for block, block_start in zip(blocks, block_starts):
+            offsets = np.repeat(block_start - block.indptr[:-1], np.diff(block.indptr))
+            indices[offsets + np.arange(block.nnz)] = block.indices + voter_offset
+            voter_offset += block.shape[0]
+
+        return cls(indptr, indices, voter_offset)
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nnz(self):
+        return int(self.indptr[-1])
+
+    def flatnonzero(self):
+        # Flat indices of all approvals, in increasing order as np.flatnonzero
+        cands = np.repeat(np.arange(self.shape[1], dtype=np.int64), np.diff(self.indptr))
+        return np.sort(self.indices.astype(np.int64) * self.shape[1] + cands)
+
+    def __rmatmul__(self, weights):
+        """
+        Return `weights @ approvals` for weights of shape (num_voters,) or (num_rules, num_voters), as integers.
+
+        The weights of the approving voters of every candidate are summed via cumulative sums over blocks of candidates
+        with at most MAX_BLOCK_ENTRIES approvals, such that temporary arrays stay small.
+        """
+        weights = np.asarray(weights)
+        marginal = np.empty(weights.shape[:-1] + (self.shape[1],), dtype=np.int64)
+
+        start_cand = 0
+        while start_cand < self.shape[1]:
+            end_cand = int(np.searchsorted(self.indptr, self.indptr[start_cand] + MAX_BLOCK_ENTRIES, side="right")) - 1
+            end_cand = min(max(end_cand, start_cand + 1), self.shape[1])
+            block_indptr = self.indptr[start_cand:end_cand + 1] - self.indptr[start_cand]
+
+            cumulative = np.zeros(weights.shape[:-1] + (block_indptr[-1] + 1,), dtype=np.int64)
+            np.cumsum(weights[..., self.indices[self.indptr[start_cand]:self.indptr[end_cand]]], axis=-1,
+                      out=cumulative[..., 1:])
+            marginal[..., start_cand:end_cand] = cumulative[..., block_indptr[1:]] - cumulative[..., block_indptr[:-1]]
+            start_cand = end_cand
+
+        return marginal
+
+    def column(self, cand):
+        return self.indices[self.indptr[cand]:self.indptr[cand + 1]]
+
+    def __getitem__(self, key):
+        """
+        approvals[:, c] and approvals[:, cands] return dense boolean columns, approvals[voters] (a boolean mask or
+        indices in increasing order) returns the profile restricted to `voters` as SparseApprovals.
+        """
+        if isinstance(key, tuple):
+            rows, cands = key
+            if rows != slice(None):
+                raise ValueError("Only whole columns of sparse approvals can be selected")
+            if np.ndim(cands) == 0:
+                column = np.zeros(self.shape[0], dtype=bool)
+                column[self.column(cands)] = True
+                return column
+            return np.stack([self[:, cand] for cand in cands], axis=-1).reshape(self.shape[0], *np.shape(cands))
+
+        mask = np.zeros(self.shape[0], dtype=bool)
+        mask[key] = True
+        new_voter_idxs = np.cumsum(mask) - 1
+        keep = mask[self.indices]
+        indptr = np.concatenate(([0], np.cumsum(keep)))[self.indptr]
+        return SparseApprovals(indptr, new_voter_idxs[self.indices[keep]].astype(np.int32), int(mask.sum()))
+
+    def _find(self, flat_idxs):
+        """
+        Return the voters and candidates of the given flat indices, the positions at which they are (or would be
+        inserted) in `indices`, and whether they are approvals.
+        """
+        voters, cands = np.divmod(flat_idxs, self.shape[1])
+        # Binary search within the columns of all entries at once
+        low, high = self.indptr[cands], self.indptr[cands + 1]
+        for _ in range(int(self.shape[0]).bit_length() if self.nnz > 0 else 0):
+            mid = (low + high) // 2
+            go_right = (mid < high) & (self.indices[np.minimum(mid, self.nnz - 1)] < voters)
+            low, high = np.where(go_right, mid + 1, low), np.where(go_right, high, mid)
+
+        positions = low
+        found = positions < self.indptr[cands + 1]
+        found[found] = self.indices[positions[found]] == voters[found]
+
+        return voters, cands, positions, found
+
+    def lookup(self, flat_idxs):
+        # Counterpart of approvals.reshape(-1)[flat_idxs] for dense approvals
+        return self._find(np.asarray(flat_idxs, dtype=np.int64))[3]
+
+    def flip(self, flat_idxs):
+        """Return a copy in which the entries with the given (distinct) flat indices are flipped."""
+        voters, cands, positions, found = self._find(np.asarray(flat_idxs, dtype=np.int64))
+
+        # Remove the found entries, and insert the others in order of (candidate, voter)
+        indices = np.delete(self.indices, positions[found])
+        order = np.lexsort((voters[~found], cands[~found]))
+        insert_positions = positions[~found][order]
+        insert_positions -= np.searchsorted(np.sort(positions[found]), insert_positions)
+        indices = np.insert(indices, insert_positions, voters[~found][order].astype(np.int32))
+
+        change = (np.bincount(cands[~found], minlength=self.shape[1])
+                  - np.bincount(cands[found], minlength=self.shape[1]))
+        indptr = self.indptr + np.concatenate(([0], np.cumsum(change)))
+
+        return SparseApprovals(indptr, indices, self.shape[0])
+
+
+def sample_sparse_entries(rng, approvals, value, k):
+    """
+    Sample `k` distinct flat indices of entries of the sparse `approvals` equal to `value`, uniformly at random and in
+    random order, see `perturbations.sample_entries`.
+    """
+    num_matching = approvals.nnz if value else approvals.size - approvals.nnz
+    if k > num_matching:
+        raise ValueError("Sample larger than population")
+    if value:
+        # Approvals are few, so they are sampled among the stored entries
+        positions = rng.choice(approvals.nnz, size=k, replace=False)
+        cands = np.searchsorted(approvals.indptr, positions, side="right") - 1
+        return approvals.indices[positions].astype(np.int64) * approvals.shape[1] + cands
+    if 2 * k > num_matching:
+        return rng.permutation(np.setdiff1d(np.arange(approvals.size), approvals.flatnonzero()))[:k]
+
+    sample = np.empty(0, dtype=np.int64)
+    while len(sample) < k:
+        batch_size = int(1.1 * (k - len(sample)) * approvals.size / num_matching) + 16
+        draws = rng.integers(0, approvals.size, size=batch_size)
+        sample = np.concatenate((sample, draws[~approvals.lookup(draws)]))
+        _, first_occurrences = np.unique(sample, return_index=True)
+        sample = sample[np.sort(first_occurrences)]
+
+    return sample[:k]
+
+
+class SparsePerturbationBuffer:
+    def __init__(self, baseline):
+        """
+        Counterpart of `perturbations.PerturbationBuffer` for SparseApprovals, which are immutable: `apply` replaces
+        `approvals` by a flipped copy, and `reset` restores `baseline`.
+        """
+        self.baseline = baseline
+        self.approvals = baseline
+
+    def apply(self, flat_idxs):
+        # Unlike `PerturbationBuffer.apply`, returns nothing, as no incremental engine follows sparse profiles
+        self.approvals = self.approvals.flip(flat_idxs)
+
+    def reset(self):
+        self.approvals = self.baseline
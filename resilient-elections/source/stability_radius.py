@@ -0,0 +1,32 @@
+# Stability radii (EXP4): for a random order of the approvals added (ADD), removed (DEL) or both alternately (MIX), the
+# smallest number of them which changes the committee of a rule. The flips are replayed one after another by the
+# incremental seqThiele engine, which only recomputes the greedy rounds from the first one whose choice changes, so most
+# flips only update the marginal scores of a single candidate (see `IncrementalSeqThiele.update_entry`), and the
+# smallest number is found even if the committee changes back later.
+
+
+def stability_radii(perturbed, engine, order):
+    """
+    For every rule of `engine` (see `incremental_seqthiele.IncrementalSeqThiele`), the smallest number of flips k such
+    that the committee after the first k flips of `order` differs from the original one, or None if it does not change
+    within all of them.
+
+    `perturbed` (see `perturbations.PerturbationBuffer`) and `engine` have to be in the original state, and are left
+    in a perturbed one, where `engine` has to be restored (see `IncrementalSeqThiele.restore`) before it is used again.
+    """
+    original_committees = [set(committee) for committee in engine.committees]
+    radii = [None] * len(original_committees)
+    # Rules whose radius is found are not followed any further
+    searched = list(range(len(original_committees)))
+    num_cand = perturbed.approvals.shape[1]
+    for num_flips in range(1, len(order) + 1):
+        perturbed.apply(order[num_flips - 1:num_flips])
+        engine.update_entry(*divmod(int(order[num_flips - 1]), num_cand), searched)
+        for rule_idx in searched:
+            if set(engine.committees[rule_idx]) != original_committees[rule_idx]:
+                radii[rule_idx] = num_flips
+        searched = [rule_idx for rule_idx in searched if radii[rule_idx] is None]
+        if not searched:
+            break
+
+    return radii
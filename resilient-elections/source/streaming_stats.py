@@ -0,0 +1,233 @@
+from collections import Counter
+
+import numpy as np
+
+from parameters import COMMITTEE_SIZE, NUM_ITERATIONS, percentage_changes
+
+# Streaming summaries of experiment results: instead of keeping every sampled distance, only mergeable statistics are
+# kept, such that their size does not depend on the number of elections or iterations. Summaries of different elections
+# (or workers) are combined with `merge`.
+
+
+class RunningStats:
+    """
+    Count, mean and variance of a stream of numbers (Welford's algorithm), where a number added with a weight counts as
+    that many occurrences of it.
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2  # sum of squared deviations from the mean
+
+    def add(self, values, weight=1):
+        values = np.asarray(values, dtype=np.float64)
+        if values.size > 0:
+            batch_mean = values.mean()
+            batch_m2 = float(((values - batch_mean) ** 2).sum())
+            self.merge(RunningStats(weight * values.size, batch_mean, weight * batch_m2))
+
+    def merge(self, other):
+        # Chan et al.'s pairwise update, which combines two Welford states exactly as if they were one stream
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+
+    def to_json(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2}
+
+
+class IntegerHistogram:
+    """
+    Number of occurrences of each value in a stream of non-negative integers.
+
+    All summarized quantities (distances in 0..COMMITTEE_SIZE and numbers of tied committees) take few distinct integer
+    values, so the histogram doubles as a mergeable quantile sketch which is exact: its quantiles coincide with
+    `np.percentile` of the full stream. Values added with a weight count as that many occurrences, which may be
+    fractional.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = Counter(counts)
+
+    def add(self, values, weight=1):
+        values, counts = np.unique(np.asarray(values, dtype=np.int64), return_counts=True)
+        self.counts.update(dict(zip(values.tolist(), (weight * counts).tolist())))
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+
+    def _values_and_counts(self):
+        # Distinct values in increasing order and their numbers of occurrences
+        values = sorted(self.counts)
+        return np.array(values), np.array([self.counts[value] for value in values])
+
+    @property
+    def mean(self):
+        values, counts = self._values_and_counts()
+        return (values * counts).sum() / counts.sum()
+
+    def quantile(self, q):
+        # Linear interpolation between order statistics, as np.percentile does by default
+        values, counts = self._values_and_counts()
+        cumulative_counts = np.cumsum(counts)
+        index = q * (cumulative_counts[-1] - 1)
+        lower = int(np.floor(index))
+        a, b = values[np.searchsorted(cumulative_counts, [lower, lower + 1], side="right").clip(max=len(values) - 1)]
+        t = index - lower
+        return b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t
+
+    def boxplot_stats(self, whis=1.5, scale=1):
+        """Statistics of the stream multiplied by `scale`, for `Axes.bxp`, as `plt.boxplot` computes them."""
+        values, counts = self._values_and_counts()
+        q1, med, q3 = (self.quantile(q) for q in (0.25, 0.5, 0.75))
+        low, high = q1 - whis * (q3 - q1), q3 + whis * (q3 - q1)
+        # Whiskers end at the most extreme values within whis * IQR of the quartiles, but never inside the box
+        whislo = min(values[values >= low].min(), q1)
+        whishi = max(values[values <= high].max(), q3)
+        fliers = np.repeat(values, np.ceil(counts).astype(np.int64))  # values with fractional counts are drawn once
+        fliers = fliers[(fliers < whislo) | (fliers > whishi)]
+
+        return {"med": scale * med, "q1": scale * q1, "q3": scale * q3, "whislo": scale * whislo,
+                "whishi": scale * whishi, "fliers": scale * fliers, "mean": scale * self.mean}
+
+    def to_json(self):
+        return {"histogram": {str(value): count for value, count in sorted(self.counts.items())}}
+
+
+class RateHistogram(IntegerHistogram):
+    """
+    Number of occurrences of each rate `successes / trials` of a stream, such as the share of the iterations of an
+    election in which a member of its committee is replaced. The (successes, trials) pairs are kept as they are, so
+    that rates of elections with different numbers of iterations are not rounded, and the quantiles and the mean are
+    those of the rates.
+    """
+
+    def add(self, successes, trials):
+        pairs = np.column_stack((np.asarray(successes, dtype=np.int64), np.asarray(trials, dtype=np.int64)))
+        pairs, counts = np.unique(pairs, axis=0, return_counts=True)
+        self.counts.update(dict(zip(map(tuple, pairs.tolist()), counts.tolist())))
+
+    def _values_and_counts(self):
+        rates = Counter()
+        for (successes, trials), count in self.counts.items():
+            rates[successes / trials] += count
+        values = sorted(rates)
+        return np.array(values), np.array([rates[value] for value in values])
+
+    @property
+    def successes(self):
+        return sum(successes * count for (successes, _), count in self.counts.items())
+
+    @property
+    def trials(self):
+        return sum(trials * count for (_, trials), count in self.counts.items())
+
+    def to_json(self):
+        return {"rates": {f"{successes}/{trials}": count for (successes, trials), count in sorted(self.counts.items())}}
+
+
+## SUMMARIES OF RESULTS ##
+# A summary has the layout of the JSON files written by `run_experiments.py`, but holds RunningStats (approval counts,
+# numbers of iterations and EXP1 distances), IntegerHistograms (EXP2) and RateHistograms (replacement rates per position
+# of the original committee in EXP3) instead of lists. Stability radii (EXP4) are kept as an IntegerHistogram of the
+# radii found and the share of orders along which none was found.
+#
+# With adaptive sampling, elections may have fewer than NUM_ITERATIONS iterations (see adaptive_sampling.py), whose
+# values are then weighted by NUM_ITERATIONS / (number of iterations). Thus, every election weighs the same, and the
+# means are those of the estimates of the single elections, whose precision ConvergenceTracker checks.
+
+def add_elections(stats, values, weights):
+    # Adds the values of every election with its weight
+    for election_values, weight in zip(values, weights):
+        stats.add(election_values, weight)
+
+
+def summarize_results(results):
+    """Summarize results in the layout of the JSON files, i.e., with one entry per election."""
+    summary = {}
+    for rule, rule_results in results.items():
+        summary[rule] = {}
+        # Only recorded with adaptive sampling, otherwise every election has NUM_ITERATIONS iterations
+        num_iterations = np.asarray(rule_results["EXP1"].get("Num_Iterations", [NUM_ITERATIONS] * len(
+            rule_results["EXP1"]["Approval_Counts"])), dtype=np.int64)
+        # Exactly 1 for elections with all iterations, which keeps the counts of the histograms integers
+        weights = [1 if n == NUM_ITERATIONS else NUM_ITERATIONS / n for n in num_iterations.tolist()]
+        for exp in ["EXP1", "EXP2", "EXP3"]:
+            summary[rule][exp] = {"Approval_Counts": RunningStats(), "Num_Iterations": RunningStats()}
+            summary[rule][exp]["Approval_Counts"].add(rule_results[exp]["Approval_Counts"])
+            summary[rule][exp]["Num_Iterations"].add(num_iterations)
+
+        for op in ["ADD", "DEL", "MIX"]:
+            summary[rule]["EXP1"][op] = {}
+            for percentage, distances in zip(percentage_changes, rule_results["EXP1"][op].values()):
+                summary[rule]["EXP1"][op][str(percentage)] = RunningStats()
+                add_elections(summary[rule]["EXP1"][op][str(percentage)], distances, weights)
+
+        summary[rule]["EXP2"]["MIX"] = {}
+        for percentage, ties in zip(percentage_changes, rule_results["EXP2"]["MIX"].values()):
+            # (number of tied committees, distance gap) per iteration
+            ties = [np.asarray(election_ties, dtype=np.int64).reshape(-1, 2) for election_ties in ties]
+            num_ties, distance_gaps = IntegerHistogram(), IntegerHistogram()
+            add_elections(num_ties, [election_ties[:, 0] for election_ties in ties], weights)
+            add_elections(distance_gaps, [election_ties[:, 1] for election_ties in ties], weights)
+            summary[rule]["EXP2"]["MIX"][str(percentage)] = {"Num_Ties": num_ties, "Distance_Gaps": distance_gaps}
+
+        summary[rule]["EXP3"]["MIX"] = {}
+        for percentage, replacements in zip(percentage_changes, rule_results["EXP3"]["MIX"].values()):
+            # (number of elections, committee size)
+            replacements = np.asarray(replacements, dtype=np.int64).reshape(len(num_iterations), COMMITTEE_SIZE)
+            summary[rule]["EXP3"]["MIX"][str(percentage)] = [RateHistogram() for _ in replacements.T]
+            for histogram, position_replacements in zip(summary[rule]["EXP3"]["MIX"][str(percentage)],
+                                                        replacements.T):
+                histogram.add(position_replacements, num_iterations)
+
+        if "EXP4" in rule_results:  # only recorded with STABILITY_RADII
+            summary[rule]["EXP4"] = {"Approval_Counts": RunningStats()}
+            summary[rule]["EXP4"]["Approval_Counts"].add(rule_results["EXP4"]["Approval_Counts"])
+            for op in ["ADD", "DEL", "MIX"]:
+                # None stands for no radius found, see stability_radius.py
+                radii = [radius for election_radii in rule_results["EXP4"][op] for radius in election_radii]
+                summary[rule]["EXP4"][op] = {"Radii": IntegerHistogram(), "Not_Found": RunningStats()}
+                summary[rule]["EXP4"][op]["Radii"].add([radius for radius in radii if radius is not None])
+                summary[rule]["EXP4"][op]["Not_Found"].add([radius is None for radius in radii])
+
+    return summary
+
+
+def merge_summaries(summary, other):
+    # Merges `other` into `summary`, which share their layout
+    if isinstance(summary, dict):
+        for key in summary:
+            merge_summaries(summary[key], other[key])
+    elif isinstance(summary, list):
+        for item, other_item in zip(summary, other):
+            merge_summaries(item, other_item)
+    else:
+        summary.merge(other)
+
+
+def summary_to_json(summary):
+    if isinstance(summary, dict):
+        return {key: summary_to_json(value) for key, value in summary.items()}
+    elif isinstance(summary, list):
+        return [summary_to_json(item) for item in summary]
+    else:
+        return summary.to_json()
+
+
+def summary_from_json(data):
+    if isinstance(data, list):
+        return [summary_from_json(item) for item in data]
+    elif "rates" in data:
+        return RateHistogram({tuple(map(int, rate.split("/"))): count for rate, count in data["rates"].items()})
+    elif "histogram" in data:
+        return IntegerHistogram({int(value): count for value, count in data["histogram"].items()})
+    elif "m2" in data:
+        return RunningStats(data["count"], data["mean"], data["m2"])
+    else:
+        return {key: summary_from_json(value) for key, value in data.items()}
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from adaptive_sampling import ELECTION_WIDTH_FACTOR, Z_95, ConvergenceTracker, half_widths, iterations_converged, \
+    wilson_half_widths
+from parameters import CI_HALF_WIDTH, CI_HALF_WIDTH_EXP3, COMMITTEE_SIZE, MIN_ELECTIONS, MIN_ITERATIONS, RULE_IDS, \
+    percentage_changes
+from streaming_stats import summarize_results
+
+# The confidence intervals of adaptive_sampling.py and the stopping of elections and parameter sets they lead to, on
+# results whose samples all agree, which stop as soon as the lower bounds of the widths allow it.
+
+
+def constant_results(num_iterations, accum=False):
+    # Results of one election whose iterations all have distance 0, no ties and no replacements, either in the layout
+    # of `run_one_election` or (with `accum`) in that of the JSON files
+    results = {}
+    for rule in RULE_IDS:
+        results[rule] = {exp: {"Approval_Counts": 100} for exp in ["EXP1", "EXP2", "EXP3"]}
+        for op in ["ADD", "DEL", "MIX"]:
+            results[rule]["EXP1"][op] = {percentage: [0] * num_iterations for percentage in percentage_changes}
+        results[rule]["EXP2"]["MIX"] = {percentage: [(1, 0)] * num_iterations for percentage in percentage_changes}
+        results[rule]["EXP3"]["MIX"] = {percentage: [0] * COMMITTEE_SIZE for percentage in percentage_changes}
+        if accum:
+            results[rule] = {exp: {key: [value] if not isinstance(value, dict) else
+                                   {percentage: [values] for percentage, values in value.items()}
+                                   for key, value in exp_results.items()}
+                             for exp, exp_results in results[rule].items()}
+            for exp in ["EXP1", "EXP2", "EXP3"]:  # recorded with adaptive sampling, see `build_results_dict`
+                results[rule][exp]["Num_Iterations"] = [num_iterations]
+    return results
+
+
+def wilson_interval(successes, trials):
+    # The rates p with |successes / trials - p| <= Z_95 * sqrt(p * (1 - p) / trials), the roots of a quadratic
+    rate, z2 = successes / trials, Z_95 ** 2 / trials
+    return np.sort(np.roots([1 + z2, -(2 * rate + z2), rate ** 2]).real)
+
+
+@pytest.mark.parametrize("num_samples", [2, 5, 30])
+def test_half_widths(num_samples):
+    # Samples whose variance is well above the floor
+    samples = np.array([0, COMMITTEE_SIZE] * (num_samples // 2) + [0] * (num_samples % 2))
+    assert half_widths(samples) == pytest.approx(Z_95 * samples.std(ddof=1) / np.sqrt(num_samples))
+
+    # Samples which all agree are as precise as if one more sample differed by the step
+    for step in [1, 0.5]:
+        differing = np.append(np.zeros(num_samples), step)
+        assert half_widths(np.zeros((1, num_samples)), step)[0] == pytest.approx(
+            Z_95 * differing.std(ddof=1) / np.sqrt(num_samples))
+    assert half_widths(np.zeros((1, num_samples)), step=0)[0] == 0
+
+
+@pytest.mark.parametrize("trials", [1, 10, 100])
+def test_wilson_half_widths(trials):
+    for successes in range(trials + 1):
+        lower, upper = wilson_interval(successes, trials)
+        assert wilson_half_widths(np.array(successes), trials) == pytest.approx((upper - lower) / 2)
+    # The width does not vanish for rates of 0 or 1
+    assert wilson_half_widths(np.array([0, trials]), trials) == pytest.approx(Z_95 ** 2 / (trials + Z_95 ** 2) / 2)
+    if trials == 100:
+        assert wilson_half_widths(np.array(50), trials) == pytest.approx(0.0962, abs=1e-4)
+
+
+def test_iterations_converged():
+    # The widths of distances and distance gaps only depend on the number of iterations, those of replacement rates
+    # are Wilson intervals of no replacements
+    expected = next(num_iterations for num_iterations in range(2, 1000)
+                    if num_iterations >= MIN_ITERATIONS
+                    and Z_95 / np.sqrt(num_iterations * (num_iterations + 1)) <= ELECTION_WIDTH_FACTOR * CI_HALF_WIDTH
+                    and Z_95 ** 2 / (num_iterations + Z_95 ** 2) / 2 <= ELECTION_WIDTH_FACTOR * CI_HALF_WIDTH_EXP3)
+    assert not iterations_converged(constant_results(expected - 1), expected - 1)
+    assert iterations_converged(constant_results(expected), expected)
+
+    # A single differing distance keeps the election going
+    results = constant_results(expected)
+    results[RULE_IDS[0]]["EXP1"]["ADD"][percentage_changes[-1]][0] = COMMITTEE_SIZE
+    assert not iterations_converged(results, expected)
+
+
+def test_convergence_tracker():
+    num_iterations = max(MIN_ITERATIONS, 2)
+    summary = summarize_results(constant_results(num_iterations, accum=True))
+    # The mean distances of the elections all agree, and the replacements of all iterations are pooled
+    expected = next(num_elections for num_elections in range(2, 1000)
+                    if num_elections >= MIN_ELECTIONS
+                    and Z_95 / np.sqrt(num_elections * (num_elections + 1)) <= CI_HALF_WIDTH
+                    and Z_95 ** 2 / (num_elections * num_iterations + Z_95 ** 2) / 2 <= CI_HALF_WIDTH_EXP3)
+
+    tracker = ConvergenceTracker()
+    for num_elections in range(1, expected + 1):
+        assert not tracker.converged
+        tracker.add(summary)
+        assert tracker.num_elections == num_elections
+    assert tracker.converged
+    np.testing.assert_array_equal(tracker.replacements[:, 1], expected * num_iterations)
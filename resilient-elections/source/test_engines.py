@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+import pytest
+from abcvoting import abcrules
+
+from approval_matrix import matrix_to_profile, seq_thiele_resolute_batch, seq_thiele_resolute_lazy, \
+    seq_thiele_resolute_matrix, stack_perturbations, thiele_weights
+from incremental_seqthiele import IncrementalSeqThiele
+from perturbations import PerturbationBuffer, sample_entries
+from sparse_approvals import SparseApprovals
+from tied_committees import seq_thiele_tie_distance, seq_thiele_tied_committees
+
+# The seqThiele engines on approval matrices against abcvoting (without the patches of run_experiments.py), on small
+# random profiles, in which ties between candidates are frequent.
+
+RULE_IDS = ["seqcc", "seqpav", "seqslav"]
+SEEDS = range(40)
+
+
+def random_election(seed):
+    rng = np.random.default_rng(seed)
+    num_voters, num_cand = rng.integers(4, 13), rng.integers(4, 9)
+    committeesize = int(rng.integers(1, num_cand))
+    approvals = rng.random((num_voters, num_cand)) < rng.uniform(0.2, 0.7)
+    return rng, approvals, committeesize
+
+
+def get_weights(rule, committeesize):
+    return thiele_weights(rule[len("seq"):], committeesize)[0]
+
+
+def abcvoting_committees(rule, approvals, committeesize, resolute, max_num_of_committees=None):
+    committees = abcrules.compute(rule, matrix_to_profile(approvals), committeesize, resolute=resolute,
+                                  max_num_of_committees=max_num_of_committees)
+    return sorted_committees(committees)
+
+
+def sorted_committees(committees):
+    # abcvoting returns the committees sorted, rather than in the order in which it finds them
+    return sorted(sorted(committee) for committee in committees)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("rule", RULE_IDS)
+def test_resolute_engines(rule, seed):
+    _, approvals, committeesize = random_election(seed)
+    weights = get_weights(rule, committeesize)
+
+    committee, delta_scores = seq_thiele_resolute_matrix(weights, approvals, committeesize, return_scores=True)
+    assert [sorted(committee)] == abcvoting_committees(rule, approvals, committeesize, resolute=True)
+    # Lazy greedy chooses the same candidates in the same order, on either representation of the profile
+    assert seq_thiele_resolute_lazy(weights, approvals, committeesize, return_scores=True) == (committee, delta_scores)
+    assert seq_thiele_resolute_lazy(weights, SparseApprovals.from_dense(approvals), committeesize,
+                                    return_scores=True) == (committee, delta_scores)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_batched_and_incremental_engines(seed):
+    rng, approvals, committeesize = random_election(seed)
+    weights = np.stack([get_weights(rule, committeesize) for rule in RULE_IDS])
+
+    # Levels of flips applied on top of each other, as in `run_experiments.evaluate_perturbations`
+    num_flips = min(np.count_nonzero(approvals), approvals.size - np.count_nonzero(approvals), 6)
+    flips = np.concatenate((sample_entries(rng, approvals, False, num_flips), sample_entries(rng, approvals, True,
+                                                                                             num_flips)))
+    level_flips = np.array_split(rng.permutation(flips), 4)
+    cumulative_flips = [np.concatenate(level_flips[:level + 1]) for level in range(len(level_flips))]
+
+    stack = stack_perturbations(approvals, [np.empty(0, dtype=np.int64)] + cumulative_flips)
+    batch_committees = seq_thiele_resolute_batch(weights, stack, committeesize)
+
+    perturbed = PerturbationBuffer(approvals)
+    engine = IncrementalSeqThiele(weights, perturbed.approvals, committeesize)
+    for level, profile in enumerate(stack):
+        if level > 0:
+            engine.update(*perturbed.apply(level_flips[level - 1]))
+        np.testing.assert_array_equal(perturbed.approvals, profile)
+        for rule_idx, rule in enumerate(RULE_IDS):
+            committee = seq_thiele_resolute_matrix(weights[rule_idx], profile, committeesize)
+            assert batch_committees[rule_idx, level].tolist() == committee
+            assert engine.committees[rule_idx] == committee
+            assert [sorted(committee)] == abcvoting_committees(rule, profile, committeesize, resolute=True)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_incremental_single_flips(seed):
+    rng, approvals, committeesize = random_election(seed)
+    weights = np.stack([get_weights(rule, committeesize) for rule in RULE_IDS])
+
+    # Flips one entry at a time, as in `stability_radius.stability_radii`
+    perturbed = PerturbationBuffer(approvals)
+    engine = IncrementalSeqThiele(weights, perturbed.approvals, committeesize)
+    for flat_idx in rng.permutation(approvals.size)[:20]:
+        perturbed.apply(np.array([flat_idx]))
+        engine.update_entry(*divmod(int(flat_idx), approvals.shape[1]))
+        for rule_idx in range(len(RULE_IDS)):
+            assert engine.committees[rule_idx] == seq_thiele_resolute_matrix(weights[rule_idx], perturbed.approvals,
+                                                                             committeesize)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("rule", RULE_IDS)
+def test_tie_enumeration(rule, seed):
+    rng, approvals, committeesize = random_election(seed)
+    weights = get_weights(rule, committeesize)
+
+    expected = abcvoting_committees(rule, approvals, committeesize, resolute=False)
+    assert sorted_committees(seq_thiele_tied_committees(weights, approvals, committeesize)) == expected
+    # The first committees found coincide with abcvoting's
+    assert sorted_committees(seq_thiele_tied_committees(weights, approvals, committeesize, 2)) \
+        == abcvoting_committees(rule, approvals, committeesize, resolute=False, max_num_of_committees=2)
+
+    reference = set(rng.choice(approvals.shape[1], committeesize, replace=False).tolist())
+    min_distance = min(len(reference - set(committee)) for committee in expected)
+    assert seq_thiele_tie_distance(weights, approvals, committeesize, reference) == (len(expected), min_distance)
+    assert seq_thiele_tie_distance(weights, approvals, committeesize, reference, prune=True)[1] == min_distance
+
+
+@pytest.mark.parametrize("rule", RULE_IDS)
+def test_all_candidates_tied(rule):
+    # Every voter approves every candidate, so all candidates are tied in every round
+    approvals = np.ones((5, 6), dtype=bool)
+    weights = get_weights(rule, 3)
+
+    assert seq_thiele_resolute_matrix(weights, approvals, 3) == [0, 1, 2]
+    assert seq_thiele_resolute_lazy(weights, approvals, 3) == [0, 1, 2]
+    assert seq_thiele_resolute_batch(weights[np.newaxis], approvals[np.newaxis], 3)[0, 0].tolist() == [0, 1, 2]
+    assert len(seq_thiele_tied_committees(weights, approvals, 3)) == math.comb(6, 3)
+    assert seq_thiele_tie_distance(weights, approvals, 3, {3, 4, 5}, prune=True)[1] == 0
@@ -0,0 +1,124 @@
+import json
+
+import numpy as np
+import pytest
+from matplotlib import cbook
+
+from parameters import COMMITTEE_SIZE, NUM_ITERATIONS, percentage_changes
+from streaming_stats import IntegerHistogram, RateHistogram, merge_summaries, summarize_results, summary_from_json, \
+    summary_to_json
+
+# The streaming summaries against the statistics of the full streams, which they replace (see streaming_stats.py).
+
+SEEDS = range(20)
+QUANTILES = [0, 0.1, 0.25, 0.5, 0.75, 0.9, 1]
+
+
+def random_samples(seed):
+    # Few distinct small integers, as the summarized distances and numbers of tied committees
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, rng.integers(1, 8), size=rng.integers(1, 50))
+
+
+def random_results(rng, num_elections):
+    # Results of `num_elections` elections in the layout of the JSON files written by `run_experiments.py`
+    results = {}
+    for rule in ["seqcc", "seqpav"]:
+        results[rule] = {exp: {"Approval_Counts": rng.integers(50, 150, num_elections).tolist()}
+                         for exp in ["EXP1", "EXP2", "EXP3", "EXP4"]}
+        for op in ["ADD", "DEL", "MIX"]:
+            results[rule]["EXP1"][op] = {
+                str(percentage): rng.integers(0, COMMITTEE_SIZE + 1, (num_elections, NUM_ITERATIONS)).tolist()
+                for percentage in percentage_changes}
+            radii = rng.integers(1, 100, (num_elections, NUM_ITERATIONS)).tolist()
+            results[rule]["EXP4"][op] = [[radius if radius < 90 else None for radius in election_radii]
+                                         for election_radii in radii]
+        results[rule]["EXP2"]["MIX"] = {
+            str(percentage): rng.integers(0, 4, (num_elections, 2 * NUM_ITERATIONS)).tolist()
+            for percentage in percentage_changes}
+        results[rule]["EXP3"]["MIX"] = {
+            str(percentage): rng.integers(0, NUM_ITERATIONS + 1, (num_elections, COMMITTEE_SIZE)).tolist()
+            for percentage in percentage_changes}
+    return results
+
+
+def assert_close(data, expected):
+    # Compares summaries in their JSON layout, up to the rounding of merged means
+    if isinstance(expected, dict):
+        assert data.keys() == expected.keys()
+        for key in expected:
+            assert_close(data[key], expected[key])
+    elif isinstance(expected, list):
+        assert len(data) == len(expected)
+        for item, expected_item in zip(data, expected):
+            assert_close(item, expected_item)
+    else:
+        assert data == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_integer_histogram_quantiles(seed):
+    samples = random_samples(seed)
+    histogram = IntegerHistogram()
+    histogram.add(samples[:len(samples) // 2])
+    histogram.add(samples[len(samples) // 2:])
+
+    for q in QUANTILES:
+        assert histogram.quantile(q) == pytest.approx(np.quantile(samples, q))
+    assert histogram.mean == pytest.approx(samples.mean())
+
+    # A weight counts as that many occurrences
+    weighted = IntegerHistogram()
+    weighted.add(samples, weight=3)
+    for q in QUANTILES:
+        assert weighted.quantile(q) == pytest.approx(np.quantile(np.repeat(samples, 3), q))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_integer_histogram_boxplot_stats(seed):
+    samples = random_samples(seed)
+    histogram = IntegerHistogram()
+    histogram.add(samples)
+
+    stats = histogram.boxplot_stats(scale=2)
+    expected = cbook.boxplot_stats(2 * samples)[0]
+    for key in ["med", "q1", "q3", "whislo", "whishi", "mean"]:
+        assert stats[key] == pytest.approx(expected[key])
+    np.testing.assert_allclose(np.sort(stats["fliers"]), np.sort(expected["fliers"]))
+
+
+def test_rate_histogram_weighting():
+    # Every election counts once, whatever its number of iterations, and equal rates of different numbers of
+    # iterations are kept apart
+    successes, trials = [1, 2, 3, 0], [2, 4, 4, 5]
+    rates = np.array(successes) / np.array(trials)
+    histogram = RateHistogram()
+    histogram.add(successes[:2], trials[:2])
+    other = RateHistogram()
+    other.add(successes[2:], trials[2:])
+    histogram.merge(other)
+
+    assert histogram.to_json() == {"rates": {"0/5": 1, "1/2": 1, "2/4": 1, "3/4": 1}}
+    assert histogram.mean == pytest.approx(rates.mean())
+    for q in QUANTILES:
+        assert histogram.quantile(q) == pytest.approx(np.quantile(rates, q))
+    # The pooled rate weighs every iteration instead
+    assert (histogram.successes, histogram.trials) == (sum(successes), sum(trials))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_merge_summaries_round_trip(seed):
+    rng = np.random.default_rng(seed)
+    results = random_results(rng, 6)
+    halves = [{rule: {exp: {key: value[start:end] if isinstance(value, list)
+                            else {percentage: values[start:end] for percentage, values in value.items()}
+                            for key, value in rule_results[exp].items()}
+                      for exp in rule_results}
+               for rule, rule_results in results.items()}
+              for start, end in [(0, 2), (2, 6)]]
+
+    # Summaries are written to and read from JSON files in between, see `util`
+    summaries = [summary_from_json(json.loads(json.dumps(summary_to_json(summarize_results(half)))))
+                 for half in halves]
+    merge_summaries(summaries[0], summaries[1])
+    assert_close(summary_to_json(summaries[0]), summary_to_json(summarize_results(results)))
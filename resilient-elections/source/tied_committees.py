@@ -0,0 +1,82 @@
+import numpy as np
+
+from approval_matrix import weighted_sums
+
+
+# Irresolute seqThiele on dense approval matrices (see `approval_matrix`): enumerates the winning committees for all
+# tiebreaking orders (aka parallel universes tiebreaking), as abcvoting's `_seq_thiele_irresolute` does.
+
+def seq_thiele_tied_committees(weights, approvals, committeesize, max_num_of_committees=None, reference=None,
+                               prune=False):
+    """
+    Compute all winning committees of a sequential Thiele method, subject to `max_num_of_committees`.
+
+    Returns the distinct winning committees as frozensets, in the order in which abcvoting finds them, such that the
+    first `max_num_of_committees` committees coincide with abcvoting's. Branches are explored depth-first, where each
+    branch derives its marginal scores from its parent by only updating the voters approving the added candidate, and
+    branches reaching an already explored partial committee (in a different order) are skipped.
+
+    If `prune` is set, branches that cannot get closer to `reference` than the closest committee found so far are
+    skipped, as well. Then only a committee at minimum distance to `reference` is guaranteed to be found.
+    """
+    return list(_tied_committees(weights, approvals, committeesize, max_num_of_committees, reference, prune))
+
+
+def _tied_committees(weights, approvals, committeesize, max_num_of_committees, reference, prune):
+    # Yields the committees of `seq_thiele_tied_committees` one after another. As every partial committee is explored
+    # once, every committee is yielded once
+    reference = frozenset(reference) if reference is not None else frozenset()
+    explored = set()
+    num_committees = 0
+    best_distance = committeesize + 1
+    done = False
+
+    def lower_bound_distance(partial_committee):
+        return max(len(reference - partial_committee) - (committeesize - len(partial_committee)), 0)
+
+    def expand(partial_committee, counts, marginal):
+        nonlocal num_committees, best_distance, done
+
+        masked = marginal.copy()
+        masked[list(partial_committee)] = -1
+        for cand in np.flatnonzero(masked == masked.max()):
+            new_committee = partial_committee | {int(cand)}
+            if new_committee in explored:
+                continue
+            explored.add(new_committee)
+            if prune and lower_bound_distance(new_committee) >= best_distance:
+                continue
+
+            if len(new_committee) == committeesize:
+                num_committees += 1
+                best_distance = min(best_distance, len(reference - new_committee))
+                yield new_committee
+                done = (max_num_of_committees is not None and num_committees == max_num_of_committees
+                        or prune and best_distance == 0)
+            else:
+                approving = approvals[:, cand]
+                counts_approving = counts[approving]
+                delta = weighted_sums(weights[counts_approving + 2] - weights[counts_approving + 1],
+                                      approvals[approving])
+                yield from expand(new_committee, counts + approving, marginal + delta)
+            if done:
+                return
+
+    counts = np.zeros(approvals.shape[0], dtype=np.int64)
+    yield from expand(frozenset(), counts, weighted_sums(weights[counts + 1], approvals))
+
+
+def seq_thiele_tie_distance(weights, approvals, committeesize, reference, max_num_of_committees=None, prune=False):
+    """
+    Return the number of winning committees (see `seq_thiele_tied_committees`) and the minimum number of members of
+    `reference` missing from any of them, i.e., the minimum distance to `reference`, without keeping the committees.
+
+    With `prune`, the number of committees only counts the committees found in branches that were not pruned.
+    """
+    reference = frozenset(reference)
+    num_committees, min_distance = 0, len(reference)
+    for committee in _tied_committees(weights, approvals, committeesize, max_num_of_committees, reference, prune):
+        num_committees += 1
+        min_distance = min(min_distance, len(reference - committee))
+
+    return num_committees, min_distance
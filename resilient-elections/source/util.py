@@ -1,20 +1,56 @@
 import json
+import os
+import pickle
+import zlib
 
+from numpy.random import SeedSequence
 
-def get_filepath(path, params):
+import parameters
+from parameters import NUM_ELECTIONS, RESULT_STORE, SEED, arrays_directory_path, jsons_directory_path, \
+    summaries_directory_path
+
+
+def get_file_stem(params):
     match params.id:
         case "1D" | "2D":
             if params.euclid_resample:
-                return f"{path}/{params.id}+res_{params.radius}.json"
+                return f"{params.id}+res_{params.radius}"
             else:
-                return f"{path}/{params.id}_{params.radius}.json"
+                return f"{params.id}_{params.radius}"
         case "Res":
-            return f"{path}/{params.id}_{params.rho}_{params.phi}.json"
+            return f"{params.id}_{params.rho}_{params.phi}"
         case _:
             raise ValueError
 
 
+# Settings which change the results, and hence have to agree between the coordinator and the workers of a distributed
+# run (see distributed.py) and between an interrupted run and its resumption
+SHARED_SETTINGS = ["NUM_ELECTIONS", "NUM_VOTERS", "NUM_CANDIDATES", "COMMITTEE_SIZE", "NUM_ITERATIONS",
+                   "MAX_NUM_COMMITTEES", "SEED", "EXP2_EXACT_TIE_COUNTS", "STABILITY_RADII", "ADAPTIVE_SAMPLING",
+                   "CI_HALF_WIDTH", "CI_HALF_WIDTH_EXP3", "MIN_ITERATIONS", "MIN_ELECTIONS", "percentage_changes",
+                   "RULE_IDS", "RESULT_STORE", "SPARSE_PROFILES"]
+
+
+def shared_settings():
+    return {name: getattr(parameters, name) for name in SHARED_SETTINGS}
+
+
+def get_seed_sequence(params, election_idx):
+    """
+    Return the seed sequence of one election, from which all its random streams are spawned.
+
+    It only depends on `SEED`, the parameter set (via its file stem, so reordering `parameter_list` does not matter) and
+    the index of the election, such that elections can be run in any order and by any worker with identical results.
+    """
+    return SeedSequence(SEED, spawn_key=(zlib.crc32(get_file_stem(params).encode()), election_idx))
+
+
+def get_filepath(path, params):
+    return f"{path}/{get_file_stem(params)}.json"
+
+
 def write_data(path, params, results):
+    os.makedirs(path, exist_ok=True)
     with open(get_filepath(path, params), "w") as fp:
         json.dump(results, fp)
 
@@ -24,3 +60,82 @@ def read_data(path, params):
         out = json.load(fp)
 
     return out
+
+
+def get_store_directory(path, params):
+    return f"{path}/{get_file_stem(params)}"
+
+
+def read_results(params):
+    # Results in the layout of the JSON files, regardless of how they are stored
+    if RESULT_STORE == "summary":
+        raise ValueError("Only summaries are stored, see read_summary")
+    elif RESULT_STORE == "npy":
+        from result_store import ResultStore
+        return ResultStore(get_store_directory(arrays_directory_path, params), NUM_ELECTIONS).to_json_schema()
+    else:
+        return read_data(jsons_directory_path, params)
+
+
+def read_summary(params):
+    # Streaming summaries of the results (see streaming_stats.py), which are computed from the full results if necessary
+    from streaming_stats import summarize_results, summary_from_json
+    if RESULT_STORE == "summary":
+        return summary_from_json(read_data(summaries_directory_path, params))
+    else:
+        return summarize_results(read_results(params))
+
+
+## RESULT SHARDS ##
+# The results of every single election are stored in their own shard as soon as the election is done, such that an
+# interrupted run can be resumed. Shards are pickled, since JSON would turn the float percentage keys into strings.
+
+def get_shard_directory(path, params):
+    return f"{path}/{get_file_stem(params)}"
+
+
+def write_shard(path, params, election_idx, results):
+    directory = get_shard_directory(path, params)
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file first, so that an interruption never leaves a truncated shard behind
+    filepath = f"{directory}/{election_idx}.pkl"
+    with open(filepath + ".tmp", "wb") as fp:
+        pickle.dump(results, fp)
+    os.replace(filepath + ".tmp", filepath)
+
+
+def read_shard(path, params, election_idx):
+    with open(f"{get_shard_directory(path, params)}/{election_idx}.pkl", "rb") as fp:
+        out = pickle.load(fp)
+
+    return out
+
+
+def check_settings(path):
+    """
+    Record the settings with which the elections stored in `path` are run, or raise an error if those stored by an
+    interrupted run had different settings, as resuming it would mix up their results.
+    """
+    filepath = f"{path}/settings.json"
+    settings = json.loads(json.dumps(shared_settings()))  # as read back, e.g., with lists instead of tuples
+    if not os.path.exists(filepath):
+        os.makedirs(path, exist_ok=True)
+        with open(filepath, "w") as fp:
+            json.dump(settings, fp)
+        return
+
+    with open(filepath) as fp:
+        stored_settings = json.load(fp)
+    changed = [name for name in SHARED_SETTINGS if stored_settings.get(name) != settings[name]]
+    if changed:
+        raise ValueError(f"The elections in {path} were run with different settings ({', '.join(changed)}), restore "
+                         f"those in {filepath} to resume the run, or move the elections away to start over")
+
+
+def completed_elections(path, params):
+    directory = get_shard_directory(path, params)
+    if not os.path.exists(directory):
+        return set()
+
+    return {int(file_name[:-len(".pkl")]) for file_name in os.listdir(directory) if file_name.endswith(".pkl")}